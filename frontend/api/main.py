@@ -0,0 +1,11 @@
+"""Vercel entry point; vercel.json rewrites every /api/* request here"""
+import os
+import sys
+
+# Serverless instances start cold, so defer the database client and store
+# setup to the first request; that creates only the unique user_id index,
+# and `python server.py setup` runs the full setup at deploy time
+os.environ.setdefault('COLD_START_MODE', '1')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from server import app  # noqa: E402,F401
@@ -1,25 +1,158 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+import time
+# Taken before anything else is imported so the startup report covers imports
+PROCESS_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import copy
+import json
+import re
+import sys
+import bisect
+import gzip
+import functools
+import asyncio
+import argparse
+import hashlib
+import hmac
 import logging
+from collections import Counter, OrderedDict
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, model_validator
+from typing import List, Optional, Dict, Literal, AsyncIterator, Awaitable, Callable, Iterable, Mapping, NamedTuple, Tuple, ClassVar, FrozenSet, Set
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import MappingProxyType
 import uuid
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone, date, timedelta
+
+# Optional accelerators: orjson for encoding, brotli for compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# === STARTUP REPORT ===
+class StartupReport:
+    """Where process start-up time goes, as named phases
+
+    Module-level phases are marked in order while the file is imported.
+    Work done later (database client, store setup) is recorded separately;
+    in cold-start mode it lands on the first request.
+    """
+
+    def __init__(self, started: float):
+        self.phases: Dict[str, float] = {}
+        self.deferred: Dict[str, float] = {}
+        self._started = started
+        self._last = started
+
+    def mark(self, phase: str) -> None:
+        """Close `phase`, which ran since the previous mark"""
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def record_deferred(self, phase: str, seconds: float) -> None:
+        self.deferred[phase] = self.deferred.get(phase, 0.0) + seconds
+
+    @property
+    def import_seconds(self) -> float:
+        return self._last - self._started
+
+    def as_dict(self, budget_ms: float) -> dict:
+        import_ms = round(self.import_seconds * 1000, 1)
+        return {
+            "import_ms": import_ms,
+            "budget_ms": budget_ms,
+            "within_budget": import_ms <= budget_ms,
+            "phases_ms": {k: round(v * 1000, 1) for k, v in self.phases.items()},
+            "deferred_ms": {k: round(v * 1000, 1) for k, v in self.deferred.items()},
+        }
+
+startup_report = StartupReport(PROCESS_STARTED)
+startup_report.mark("imports")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Versioned curriculum file (JSON, or YAML by extension). With
+# CURRICULUM_SOURCE=mongo the newest document in the `curriculum`
+# collection takes over from it. Sources are re-checked every
+# CURRICULUM_CHECK_SECONDS (0 disables reloading).
+CURRICULUM_PATH = os.environ.get('CURRICULUM_PATH', str(ROOT_DIR / 'curriculum.json'))
+CURRICULUM_SOURCE = os.environ.get('CURRICULUM_SOURCE', 'file')
+CURRICULUM_CHECK_SECONDS = float(os.environ.get('CURRICULUM_CHECK_SECONDS', '30'))
+
+# Storage engine: "mongo" (default), "sqlite" or "memory"
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'study_tracker.db'))
+
+# Requests without credentials fall back to this user, which keeps the
+# single-user frontend working unchanged
+DEFAULT_USER_ID = os.environ.get('DEFAULT_USER_ID', 'default')
+# When set, callers must present an HS256 bearer token whose `sub` is the user id
+JWT_SECRET = os.environ.get('JWT_SECRET')
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.@-]{1,128}$')
+# Bearer token for the /api/admin routes, which are disabled when unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '1024'))
+# How long (seconds) a progress read may be reused, and for how many users;
+# a TTL of 0 keeps only the coalescing of concurrent reads
+PROGRESS_CACHE_TTL = float(os.environ.get('PROGRESS_CACHE_TTL', '2'))
+PROGRESS_CACHE_SIZE = int(os.environ.get('PROGRESS_CACHE_SIZE', '4096'))
+# Leaderboard entries kept in memory per scope (the largest servable limit),
+# and how often (seconds) they are reloaded to pick up other instances' writes
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '100'))
+LEADERBOARD_TTL = float(os.environ.get('LEADERBOARD_TTL', '30'))
+# Users whose analytics stay cached, and the trailing window (days) that
+# completion velocity is measured over
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', '1024'))
+VELOCITY_WINDOW_DAYS = int(os.environ.get('VELOCITY_WINDOW_DAYS', '28'))
+# Most operations accepted by one /api/batch call, and how many applied
+# idempotency keys are remembered per user to reject replays
+MAX_BATCH_OPS = 100
+IDEMPOTENCY_WINDOW = int(os.environ.get('IDEMPOTENCY_WINDOW', '500'))
+# JSON bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+# NDJSON export/import: bytes buffered per streamed export chunk, records
+# per import bulk write, longest accepted import line and errors reported
+EXPORT_CHUNK_BYTES = 64 * 1024
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+IMPORT_MAX_LINE_BYTES = 1024 * 1024
+IMPORT_MAX_ERRORS = 100
+# Deltas buffered per /api/progress/stream subscriber before it is told to
+# resync, and the idle interval between keep-alive comments
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', '32'))
+STREAM_KEEPALIVE_SECONDS = 15
+# Serverless deployments (Vercel sets VERCEL=1) run in cold-start mode: no
+# index creation at start-up, which is left to `python server.py setup` at
+# deploy time. The import-time budget is checked on every start-up.
+COLD_START_MODE = os.environ.get('COLD_START_MODE', os.environ.get('VERCEL', '')).lower() in ('1', 'true')
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', '500'))
+# Background jobs run in-process unless disabled, which is the default in
+# cold-start mode since serverless instances are frozen between requests.
+# Lapsed streaks are expired every STREAK_EXPIRY_SECONDS, and jobs yield
+# to requests after every JOB_CHUNK_SIZE users.
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '0' if COLD_START_MODE else '1').lower() in ('1', 'true')
+STREAK_EXPIRY_SECONDS = float(os.environ.get('STREAK_EXPIRY_SECONDS', '600'))
+JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE', '200'))
+
+if JWT_SECRET:
+    # Only needed to verify bearer tokens
+    import jwt
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -30,107 +163,280 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+startup_report.mark("config")
 
-# === SUBJECTS DATA ===
-SUBJECTS_DATA = {
-    "MATHS": {
-        "name": "MATHS",
-        "color": "#2563eb",
-        "image": "https://images.pexels.com/photos/7233188/pexels-photo-7233188.jpeg",
-        "units": [
-            {"id": "maths-1", "name": "Matrices and Gaussian Elimination", "xp": 100},
-            {"id": "maths-2", "name": "Vector Spaces", "xp": 100},
-            {"id": "maths-3", "name": "Linear Transformations and Orthogonality", "xp": 100},
-            {"id": "maths-4", "name": "Orthogonalization, Eigen Values and Eigen Vectors", "xp": 100},
-            {"id": "maths-5", "name": "Singular Value Decomposition", "xp": 100}
-        ]
-    },
-    "PDSP": {
-        "name": "PDSP",
-        "color": "#9333ea",
-        "image": "https://images.pexels.com/photos/18068747/pexels-photo-18068747.png",
-        "units": [
-            {"id": "pdsp-1", "name": "Discrete Fourier Transform", "xp": 100},
-            {"id": "pdsp-2", "name": "Fast Fourier Transform", "xp": 100},
-            {"id": "pdsp-3", "name": "Design of IIR Filters", "xp": 100},
-            {"id": "pdsp-4", "name": "FIR Filters", "xp": 100}
-        ]
-    },
-    "DVLSI": {
-        "name": "DVLSI",
-        "color": "#16a34a",
-        "image": "https://images.pexels.com/photos/35348462/pexels-photo-35348462.jpeg",
-        "units": [
-            {"id": "dvlsi-1", "name": "MOS Inverters", "xp": 100},
-            {"id": "dvlsi-2", "name": "Fabrication of MOSFETs and Layout", "xp": 100},
-            {"id": "dvlsi-3", "name": "Switching Characteristics & Bi-stable Elements", "xp": 100},
-            {"id": "dvlsi-4", "name": "Sequential MOS Logic & Memories", "xp": 100}
-        ]
-    },
-    "CONTROL SYSTEM": {
-        "name": "CONTROL SYSTEM",
-        "color": "#ea580c",
-        "image": "https://images.pexels.com/photos/159298/gears-cogs-machine-machinery-159298.jpeg",
-        "units": [
-            {"id": "control-1", "name": "Mathematical Modelling of Linear Systems", "xp": 100},
-            {"id": "control-2", "name": "Performance of Feedback Control Systems", "xp": 100},
-            {"id": "control-3", "name": "Stability Analysis", "xp": 100},
-            {"id": "control-4", "name": "Frequency Response", "xp": 100}
-        ]
-    },
-    "EMFT": {
-        "name": "EMFT",
-        "color": "#db2777",
-        "image": "https://images.pexels.com/photos/2996279/pexels-photo-2996279.jpeg",
-        "units": [
-            {"id": "emft-1", "name": "Vectors and Electrostatics", "xp": 100},
-            {"id": "emft-2", "name": "Coulomb's Law & Gauss Law", "xp": 100},
-            {"id": "emft-3", "name": "Magnetostatics", "xp": 100},
-            {"id": "emft-4", "name": "Time Varying Fields and Wave Theory", "xp": 100}
-        ]
-    }
-}
-
-# === ACHIEVEMENTS DATA ===
-ACHIEVEMENTS_DATA = [
-    # MATHS Achievements
-    {"id": "matrix-master", "name": "Matrix Master", "description": "Complete Matrices and Gaussian Elimination", "subject": "MATHS", "unit_id": "maths-1", "icon": "grid-3x3"},
-    {"id": "vector-virtuoso", "name": "Vector Virtuoso", "description": "Complete Vector Spaces", "subject": "MATHS", "unit_id": "maths-2", "icon": "move-3d"},
-    {"id": "transformation-titan", "name": "Transformation Titan", "description": "Complete Linear Transformations", "subject": "MATHS", "unit_id": "maths-3", "icon": "rotate-3d"},
-    {"id": "eigen-explorer", "name": "Eigen Explorer", "description": "Complete Eigen Values and Vectors", "subject": "MATHS", "unit_id": "maths-4", "icon": "compass"},
-    {"id": "svd-sage", "name": "SVD Sage", "description": "Complete Singular Value Decomposition", "subject": "MATHS", "unit_id": "maths-5", "icon": "split"},
-    
-    # PDSP Achievements
-    {"id": "dft-decoder", "name": "DFT Decoder", "description": "Complete Discrete Fourier Transform", "subject": "PDSP", "unit_id": "pdsp-1", "icon": "waves"},
-    {"id": "fft-fanatic", "name": "FFT Fanatic", "description": "Complete Fast Fourier Transform", "subject": "PDSP", "unit_id": "pdsp-2", "icon": "zap"},
-    {"id": "iir-innovator", "name": "IIR Innovator", "description": "Complete Design of IIR Filters", "subject": "PDSP", "unit_id": "pdsp-3", "icon": "filter"},
-    {"id": "fir-finisher", "name": "FIR Finisher", "description": "Complete FIR Filters", "subject": "PDSP", "unit_id": "pdsp-4", "icon": "bar-chart-2"},
-    
-    # DVLSI Achievements
-    {"id": "inverter-ace", "name": "Inverter Ace", "description": "Complete MOS Inverters", "subject": "DVLSI", "unit_id": "dvlsi-1", "icon": "flip-vertical"},
-    {"id": "fab-fabricator", "name": "Fab Fabricator", "description": "Complete Fabrication of MOSFETs", "subject": "DVLSI", "unit_id": "dvlsi-2", "icon": "cpu"},
-    {"id": "switching-specialist", "name": "Switching Specialist", "description": "Complete Switching Characteristics", "subject": "DVLSI", "unit_id": "dvlsi-3", "icon": "toggle-right"},
-    {"id": "memory-mogul", "name": "Memory Mogul", "description": "Complete Sequential MOS Logic & Memories", "subject": "DVLSI", "unit_id": "dvlsi-4", "icon": "hard-drive"},
-    
-    # CONTROL SYSTEM Achievements
-    {"id": "modelling-maven", "name": "Modelling Maven", "description": "Complete Mathematical Modelling", "subject": "CONTROL SYSTEM", "unit_id": "control-1", "icon": "function-square"},
-    {"id": "feedback-finesse", "name": "Feedback Finesse", "description": "Complete Feedback Control Systems", "subject": "CONTROL SYSTEM", "unit_id": "control-2", "icon": "refresh-cw"},
-    {"id": "stability-strategist", "name": "Stability Strategist", "description": "Complete Stability Analysis", "subject": "CONTROL SYSTEM", "unit_id": "control-3", "icon": "scale"},
-    {"id": "frequency-finder", "name": "Frequency Finder", "description": "Complete Frequency Response", "subject": "CONTROL SYSTEM", "unit_id": "control-4", "icon": "radio"},
-    
-    # EMFT Achievements
-    {"id": "vector-veteran", "name": "Vector Veteran", "description": "Complete Vectors and Electrostatics", "subject": "EMFT", "unit_id": "emft-1", "icon": "arrow-up-right"},
-    {"id": "electrostatic-expert", "name": "Electrostatic Expert", "description": "Complete Coulomb's & Gauss Law", "subject": "EMFT", "unit_id": "emft-2", "icon": "atom"},
-    {"id": "magnetostatic-master", "name": "Magnetostatic Master", "description": "Complete Magnetostatics", "subject": "EMFT", "unit_id": "emft-3", "icon": "magnet"},
-    {"id": "wave-warrior", "name": "Wave Warrior", "description": "Complete Time Varying Fields", "subject": "EMFT", "unit_id": "emft-4", "icon": "activity"},
-    
-    # Special Achievements
-    {"id": "streak-starter", "name": "Streak Starter", "description": "Maintain a 3-day study streak", "subject": "SPECIAL", "unit_id": None, "icon": "flame"},
-    {"id": "week-warrior", "name": "Week Warrior", "description": "Maintain a 7-day study streak", "subject": "SPECIAL", "unit_id": None, "icon": "calendar"},
-    {"id": "pomodoro-pro", "name": "Pomodoro Pro", "description": "Complete 10 pomodoro sessions", "subject": "SPECIAL", "unit_id": None, "icon": "timer"},
-    {"id": "subject-scholar", "name": "Subject Scholar", "description": "Complete all units of any subject", "subject": "SPECIAL", "unit_id": None, "icon": "award"},
-    {"id": "ultimate-achiever", "name": "Ultimate Achiever", "description": "Complete all units of all subjects", "subject": "SPECIAL", "unit_id": None, "icon": "trophy"},
-]
+# === JSON ENCODING ===
+class RawJSON(bytes):
+    """Already-encoded JSON, spliced verbatim by encode_object"""
+
+def json_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+def encode_object(pairs: Iterable[Tuple[str, object]]) -> RawJSON:
+    """Encode key/value pairs as a JSON object, keeping RawJSON values as-is"""
+    return RawJSON(b"{" + b",".join(
+        json_bytes(key) + b":" + (value if isinstance(value, RawJSON) else json_bytes(value))
+        for key, value in pairs
+    ) + b"}")
+
+def object_prefix(static: dict) -> bytes:
+    """Encoded `static` without its closing brace, to be completed by splice"""
+    return json_bytes(static)[:-1]
+
+def splice(prefix: bytes, dynamic: dict) -> RawJSON:
+    """Complete a pre-encoded object prefix with per-request fields"""
+    if not dynamic:
+        return RawJSON(prefix + b"}")
+    tail = json_bytes(dynamic)[1:]
+    return RawJSON(prefix + tail if prefix == b"{" else prefix + b"," + tail)
+
+def encode_array(items: Iterable[bytes]) -> RawJSON:
+    return RawJSON(b"[" + b",".join(items) + b"]")
+
+# === ACHIEVEMENT RULES ===
+# Each achievement is compiled into a typed rule. A rule declares the
+# progress field it watches, so a write only evaluates the rules whose
+# inputs it actually changed.
+class RuleState(NamedTuple):
+    completed_units: FrozenSet[str]
+    streak_days: int
+    pomodoro_sessions: int
+    new_units: FrozenSet[str]
+
+@dataclass(frozen=True)
+class UnitRule:
+    achievement_id: str
+    unit_id: str
+    watches: ClassVar[str] = "completed_units"
+
+    def is_met(self, state: RuleState) -> bool:
+        return self.unit_id in state.completed_units
+
+@dataclass(frozen=True)
+class StreakRule:
+    achievement_id: str
+    threshold: int
+    watches: ClassVar[str] = "streak_days"
+
+    def is_met(self, state: RuleState) -> bool:
+        return state.streak_days >= self.threshold
+
+@dataclass(frozen=True)
+class PomodoroRule:
+    achievement_id: str
+    threshold: int
+    watches: ClassVar[str] = "pomodoro_sessions"
+
+    def is_met(self, state: RuleState) -> bool:
+        return state.pomodoro_sessions >= self.threshold
+
+@dataclass(frozen=True)
+class SubjectCompleteRule:
+    achievement_id: str
+    unit_subjects: Mapping[str, str]
+    subject_unit_ids: Mapping[str, FrozenSet[str]]
+    watches: ClassVar[str] = "completed_units"
+
+    def is_met(self, state: RuleState) -> bool:
+        # Only subjects touched by this write can have just been completed
+        subjects = (
+            {self.unit_subjects[u] for u in state.new_units if u in self.unit_subjects}
+            if state.new_units else self.subject_unit_ids.keys()
+        )
+        return any(self.subject_unit_ids[s] <= state.completed_units for s in subjects)
+
+@dataclass(frozen=True)
+class AllCompleteRule:
+    achievement_id: str
+    all_unit_ids: FrozenSet[str]
+    watches: ClassVar[str] = "completed_units"
+
+    def is_met(self, state: RuleState) -> bool:
+        return len(state.completed_units) >= len(self.all_unit_ids) and self.all_unit_ids <= state.completed_units
+
+# === CURRICULUM ===
+# Subjects, units and achievements are data: a versioned JSON/YAML file,
+# or the newest document in Mongo's `curriculum` collection. Each version
+# is validated into frozen models and everything derived from it is built
+# once, on one immutable Curriculum that is swapped in as a whole.
+OVERALL_SCOPE = "overall"
+# Achievement fields served to clients (rules stay server-side)
+ACHIEVEMENT_FIELDS: Tuple[str, ...] = ("id", "name", "description", "subject", "unit_id", "icon")
+ACHIEVEMENT_ITEM_FIELDS: Tuple[str, ...] = ACHIEVEMENT_FIELDS + ("unlocked",)
+
+class CurriculumUnit(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    id: str
+    name: str
+    xp: int = Field(100, ge=0)
+
+class CurriculumSubject(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    name: str
+    color: str
+    image: str
+    units: Tuple[CurriculumUnit, ...] = Field(min_length=1)
+
+class RuleSpec(BaseModel):
+    """How an achievement that is not tied to a unit is earned"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["streak", "pomodoro", "subject_complete", "all_complete"]
+    threshold: int = Field(1, ge=1)
+
+class CurriculumAchievement(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    id: str
+    name: str
+    description: str
+    subject: str
+    unit_id: Optional[str] = None
+    icon: str
+    rule: Optional[RuleSpec] = None
+
+class CurriculumDocument(BaseModel):
+    # Extra keys are ignored so Mongo documents validate as they are stored
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    version: int = Field(ge=1)
+    subjects: Dict[str, CurriculumSubject] = Field(min_length=1)
+    achievements: Tuple[CurriculumAchievement, ...] = ()
+
+    @model_validator(mode="after")
+    def check_references(self) -> "CurriculumDocument":
+        unit_ids = [unit.id for subject in self.subjects.values() for unit in subject.units]
+        names = [subject.name.lower() for subject in self.subjects.values()]
+        achievement_ids = [achievement.id for achievement in self.achievements]
+        for label, values in (("unit ids", unit_ids), ("subject names", names), ("achievement ids", achievement_ids)):
+            duplicates = sorted(value for value, count in Counter(values).items() if count > 1)
+            if duplicates:
+                raise ValueError(f"Duplicate {label}: {', '.join(duplicates)}")
+        if OVERALL_SCOPE in self.subjects or OVERALL_SCOPE in names:
+            raise ValueError(f"'{OVERALL_SCOPE}' is reserved for the overall leaderboard")
+        known_units = set(unit_ids)
+        for achievement in self.achievements:
+            if (achievement.unit_id is None) == (achievement.rule is None):
+                raise ValueError(f"Achievement {achievement.id} needs exactly one of unit_id and rule")
+            if achievement.unit_id is not None and achievement.unit_id not in known_units:
+                raise ValueError(f"Achievement {achievement.id} refers to unknown unit {achievement.unit_id}")
+            if achievement.subject != "SPECIAL" and achievement.subject not in self.subjects:
+                raise ValueError(f"Achievement {achievement.id} refers to unknown subject {achievement.subject}")
+        return self
+
+class UnitRef(NamedTuple):
+    subject: str
+    xp: int
+
+class Curriculum:
+    """One curriculum version and the lookup structures, rules and encoded
+    response prefixes derived from it
+
+    Nothing here changes after construction. Code that spans an await
+    should read the module-level `curriculum` once and keep using that
+    snapshot, so a swap mid-request cannot mix two versions. Progress may
+    still name units a later version removed: lookups skip them, so they
+    count towards no subject, total or rule, while the XP already earned
+    for them is kept (until a replay, which skips their events).
+    """
+
+    def __init__(self, document: CurriculumDocument):
+        self.document = document
+        self.version = document.version
+        self.subjects: Mapping[str, CurriculumSubject] = MappingProxyType(dict(document.subjects))
+        self.achievements = document.achievements
+        self.unit_index: Mapping[str, UnitRef] = MappingProxyType({
+            unit.id: UnitRef(subject_key, unit.xp)
+            for subject_key, subject in self.subjects.items()
+            for unit in subject.units
+        })
+        self.subject_unit_ids: Mapping[str, FrozenSet[str]] = MappingProxyType({
+            subject_key: frozenset(unit.id for unit in subject.units)
+            for subject_key, subject in self.subjects.items()
+        })
+        # Column lookups for vectorised maps over unit ids (see compute_analytics)
+        self.unit_xp: Mapping[str, int] = MappingProxyType({u: ref.xp for u, ref in self.unit_index.items()})
+        self.unit_subjects: Mapping[str, str] = MappingProxyType({u: ref.subject for u, ref in self.unit_index.items()})
+        self.all_unit_ids: FrozenSet[str] = frozenset(self.unit_index)
+        self.total_units = len(self.all_unit_ids)
+        # Subject pages address subjects by case-insensitive name
+        self.subject_keys_by_name: Mapping[str, str] = MappingProxyType({
+            subject.name.lower(): subject_key for subject_key, subject in self.subjects.items()
+        })
+        self.leaderboard_scopes: Tuple[str, ...] = (OVERALL_SCOPE, *self.subjects)
+        
+        # The constant parts of read responses, encoded once. Per-user
+        # progress is spliced onto these prefixes, so only the small
+        # dynamic tail is encoded per request.
+        self.subject_prefixes: Mapping[str, bytes] = MappingProxyType({
+            subject_key: object_prefix(subject.model_dump())
+            for subject_key, subject in self.subjects.items()
+        })
+        self._achievement_prefixes: Dict[Optional[Tuple[str, ...]], Tuple[Tuple[str, bytes], ...]] = {}
+        # Everything static, served to browsers and CDNs by GET /api/catalog
+        self.catalog_json = json_bytes({
+            "version": self.version,
+            "subjects": [subject.model_dump() for subject in self.subjects.values()],
+            "achievements": [a.model_dump(include=set(ACHIEVEMENT_FIELDS)) for a in self.achievements]
+        })
+        self.catalog_etag = f'"{hashlib.sha1(self.catalog_json).hexdigest()[:24]}"'
+        
+        self.rules = tuple(self.compile_rule(a) for a in self.achievements)
+        self.unit_rules: Mapping[str, Tuple[UnitRule, ...]] = MappingProxyType({
+            unit_id: tuple(r for r in self.rules if isinstance(r, UnitRule) and r.unit_id == unit_id)
+            for unit_id in self.unit_index
+        })
+        self.rules_by_field: Mapping[str, Tuple] = MappingProxyType({
+            field: tuple(r for r in self.rules if r.watches == field)
+            for field in ("completed_units", "streak_days", "pomodoro_sessions")
+        })
+        # Rules over completed_units that are not keyed by a single unit
+        self.aggregate_unit_rules = tuple(
+            r for r in self.rules_by_field["completed_units"] if not isinstance(r, UnitRule)
+        )
+
+    def compile_rule(self, achievement: CurriculumAchievement):
+        if achievement.unit_id is not None:
+            return UnitRule(achievement.id, achievement.unit_id)
+        spec = achievement.rule
+        if spec.type == "streak":
+            return StreakRule(achievement.id, spec.threshold)
+        if spec.type == "pomodoro":
+            return PomodoroRule(achievement.id, spec.threshold)
+        if spec.type == "subject_complete":
+            return SubjectCompleteRule(achievement.id, self.unit_subjects, self.subject_unit_ids)
+        return AllCompleteRule(achievement.id, self.all_unit_ids)
+
+    def achievement_prefixes(self, fields: Optional[Tuple[str, ...]] = None) -> Tuple[Tuple[str, bytes], ...]:
+        """(achievement id, encoded prefix) pairs for a `fields=` selection"""
+        prefixes = self._achievement_prefixes.get(fields)
+        if prefixes is None:
+            include = [k for k in ACHIEVEMENT_FIELDS if fields is None or k in fields]
+            prefixes = self._achievement_prefixes[fields] = tuple(
+                (a.id, object_prefix(a.model_dump(include=set(include)))) for a in self.achievements
+            )
+        return prefixes
+
+    def subject_xp(self, completed_units: Iterable[str]) -> Dict[str, int]:
+        """XP earned in each subject; units no longer in the curriculum count for nothing"""
+        totals = dict.fromkeys(self.subjects, 0)
+        for unit_id in completed_units:
+            unit = self.unit_index.get(unit_id)
+            if unit is not None:
+                totals[unit.subject] += unit.xp
+        return totals
+
+def parse_curriculum(text: str, path: str) -> CurriculumDocument:
+    """Validate a curriculum file's contents; YAML when the path ends in .yaml/.yml"""
+    if path.endswith((".yaml", ".yml")):
+        import yaml
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    return CurriculumDocument.model_validate(data)
+
+curriculum = Curriculum(parse_curriculum(Path(CURRICULUM_PATH).read_text(encoding="utf-8"), CURRICULUM_PATH))
+
+startup_report.mark("catalog")
 
 # === PYDANTIC MODELS ===
 class UnitProgress(BaseModel):
@@ -141,13 +447,20 @@ class UnitProgress(BaseModel):
 class UserProgress(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
     completed_units: List[str] = []
     xp: int = 0
+    # XP per subject, derived from completed_units so leaderboards can index it
+    subject_xp: Dict[str, int] = Field(default_factory=lambda: curriculum.subject_xp(()))
     level: int = 1
     streak_days: int = 0
     last_study_date: Optional[str] = None
     pomodoro_sessions: int = 0
     unlocked_achievements: List[str] = []
+    # Bumped by every mutation; keys the response cache and ETags
+    version: int = 0
+    # Recent idempotency keys as {"key", "write_id"} (see /api/batch)
+    applied_ops: List[dict] = []
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
@@ -158,6 +471,38 @@ class PomodoroSessionRequest(BaseModel):
     duration_minutes: int
     completed: bool
 
+class StudyEvent(BaseModel):
+    """Append-only record of a toggle or pomodoro; progress snapshots are a fold of these"""
+    model_config = ConfigDict(extra="ignore")
+    user_id: str
+    type: Literal["toggle", "pomodoro", "baseline", "reset"]
+    ts: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    # Position within a single write, so batched events replay in order
+    seq: int = 0
+    # Study day as seen by the streak logic when the event was recorded
+    day: str = Field(default_factory=lambda: date.today().isoformat())
+    unit_id: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    key: Optional[str] = None
+    # Progress carried over from before event logging (baseline events only)
+    snapshot: Optional[dict] = None
+
+class BatchOperation(BaseModel):
+    op: Literal["toggle", "pomodoro"]
+    idempotency_key: str = Field(min_length=1, max_length=128)
+    unit_id: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    completed: bool = True
+
+    @model_validator(mode="after")
+    def check_unit(self) -> "BatchOperation":
+        if self.op == "toggle" and not self.unit_id:
+            raise ValueError("toggle operations need a unit_id")
+        return self
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(min_length=1, max_length=MAX_BATCH_OPS)
+
 class SubjectResponse(BaseModel):
     name: str
     color: str
@@ -178,6 +523,8 @@ class DashboardResponse(BaseModel):
     subjects: List[SubjectResponse]
     unlocked_achievements: List[str]
 
+startup_report.mark("models")
+
 # === HELPER FUNCTIONS ===
 def calculate_level(xp: int) -> int:
     """Calculate level based on XP (100 XP per level)"""
@@ -189,200 +536,2468 @@ def xp_to_next_level(xp: int) -> int:
     next_level_xp = current_level * 500
     return next_level_xp - xp
 
-async def get_or_create_progress() -> dict:
-    """Get existing progress or create new one"""
-    progress = await db.user_progress.find_one({}, {"_id": 0})
-    if not progress:
-        new_progress = UserProgress()
-        doc = new_progress.model_dump()
-        await db.user_progress.insert_one(doc)
-        progress = doc
-    return progress
+# === METRICS ===
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
-async def check_and_unlock_achievements(progress: dict) -> List[str]:
-    """Check if any new achievements should be unlocked"""
-    newly_unlocked = []
-    completed_units = set(progress.get("completed_units", []))
-    unlocked = set(progress.get("unlocked_achievements", []))
-    
-    for achievement in ACHIEVEMENTS_DATA:
-        if achievement["id"] in unlocked:
+class Histogram:
+    """Latency histogram over LATENCY_BUCKETS plus an overflow bucket"""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+def format_labels(labels: Mapping[str, object]) -> str:
+    escaped = (
+        str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for v in labels.values()
+    )
+    return ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped))
+
+class Metrics:
+    """Process-local request and database metrics in Prometheus text format
+
+    Routes are labelled by their path template, so user ids and other
+    path parameters never create new series.
+    """
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.db_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.progress_reads: Dict[str, int] = {}
+        self.job_runs: Dict[Tuple[str, str], int] = {}
+        self.job_duration: Dict[Tuple[str], Histogram] = {}
+
+    def count_progress_read(self, source: str) -> None:
+        self.progress_reads[source] = self.progress_reads.get(source, 0) + 1
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.request_latency.setdefault((method, route), Histogram()).observe(seconds)
+
+    def observe_db(self, operation: str, collection: str, seconds: float) -> None:
+        self.db_latency.setdefault((operation, collection), Histogram()).observe(seconds)
+
+    def observe_job(self, job: str, outcome: str, seconds: float) -> None:
+        key = (job, outcome)
+        self.job_runs[key] = self.job_runs.get(key, 0) + 1
+        self.job_duration.setdefault((job,), Histogram()).observe(seconds)
+
+    @staticmethod
+    def render_histogram(lines: List[str], name: str, label_names: Tuple[str, ...], series: Dict[tuple, Histogram]) -> None:
+        for key, histogram in sorted(series.items()):
+            labels = format_labels(dict(zip(label_names, key)))
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_total HTTP requests by route and status code",
+            "# TYPE http_requests_total counter",
+        ]
+        for key, count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{format_labels(dict(zip(('method', 'route', 'status'), key)))}}} {count}")
+        lines += [
+            "# HELP http_request_duration_seconds HTTP request latency by route",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        self.render_histogram(lines, "http_request_duration_seconds", ("method", "route"), self.request_latency)
+        lines += [
+            "# HELP db_operation_duration_seconds Database call latency by operation and collection",
+            "# TYPE db_operation_duration_seconds histogram",
+        ]
+        self.render_histogram(lines, "db_operation_duration_seconds", ("operation", "collection"), self.db_latency)
+        lines += [
+            "# HELP progress_reads_total Progress reads by how they were served (cache, coalesced, store)",
+            "# TYPE progress_reads_total counter",
+        ]
+        for source, count in sorted(self.progress_reads.items()):
+            lines.append(f"progress_reads_total{{{format_labels({'source': source})}}} {count}")
+        lines += [
+            "# HELP background_job_runs_total Background job runs by outcome (ok, error)",
+            "# TYPE background_job_runs_total counter",
+        ]
+        for key, count in sorted(self.job_runs.items()):
+            lines.append(f"background_job_runs_total{{{format_labels(dict(zip(('job', 'outcome'), key)))}}} {count}")
+        lines += [
+            "# HELP background_job_duration_seconds Background job run time",
+            "# TYPE background_job_duration_seconds histogram",
+        ]
+        self.render_histogram(lines, "background_job_duration_seconds", ("job",), self.job_duration)
+        lines += [
+            "# HELP startup_phase_seconds Start-up time of this process by phase",
+            "# TYPE startup_phase_seconds gauge",
+        ]
+        for phase, seconds in (*startup_report.phases.items(), *startup_report.deferred.items()):
+            lines.append(f"startup_phase_seconds{{{format_labels({'phase': phase})}}} {seconds}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class RequestTiming:
+    """Where one request's time went, reported in its Server-Timing header
+
+    Database time is the wall-clock union of in-flight calls, so calls
+    issued concurrently are not counted twice.
+    """
+
+    __slots__ = ("db", "spans", "_in_flight", "_db_started")
+
+    def __init__(self):
+        self.db = 0.0
+        self.spans: Dict[str, float] = {}
+        self._in_flight = 0
+        self._db_started = 0.0
+
+    def db_call_started(self, now: float) -> None:
+        if self._in_flight == 0:
+            self._db_started = now
+        self._in_flight += 1
+
+    def db_call_finished(self, now: float) -> None:
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self.db += now - self._db_started
+
+    def header(self, total: float) -> str:
+        entries = [("db", self.db), ("compute", max(total - self.db, 0.0)), *self.spans.items(), ("total", total)]
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in entries)
+
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+@contextmanager
+def db_timer(operation: str, collection: str):
+    """Time one database call into the metrics and the current request"""
+    timing = request_timing.get()
+    start = time.perf_counter()
+    if timing is not None:
+        timing.db_call_started(start)
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if timing is not None:
+            timing.db_call_finished(end)
+        metrics.observe_db(operation, collection, end - start)
+
+@contextmanager
+def timed_span(name: str):
+    """Attribute a block of in-process work to a named Server-Timing entry"""
+    timing = request_timing.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.spans[name] = timing.spans.get(name, 0.0) + time.perf_counter() - start
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics and adding Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = timing.header(time.perf_counter() - start).encode()
+                message["headers"] = [*message.get("headers", []), (b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timing.reset(token)
+            # Set by the router on a match; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.observe_request(scope["method"], route, status, time.perf_counter() - start)
+
+# === RESPONSE CACHE ===
+class ResponseCache:
+    """LRU of rendered JSON bodies keyed by (user, progress version, route)
+
+    A progress version never changes content, so entries need no
+    invalidation; mutations simply make them unreachable until evicted.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: tuple, body: bytes) -> None:
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+def make_etag(user_id: str, version: int, route: str) -> str:
+    """Strong ETag for a route's body at a given progress version"""
+    digest = hashlib.sha1(f"{user_id}\0{version}\0{route}".encode()).hexdigest()
+    return f'"{digest[:24]}"'
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag of one content coding of a body; strong validators must differ per coding"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """The If-None-Match validator naming `etag` in any content coding, if one does"""
+    if not if_none_match:
+        return None
+    variants = {etag, variant_etag(etag, "br"), variant_etag(etag, "gzip")}
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate == "*":
+            return etag
+        if candidate in variants:
+            return candidate
+    return None
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred supported content coding: br, then gzip, else None"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip().removeprefix("q=")
+        if params and q.replace(".", "", 1).isdigit() and float(q) == 0:
             continue
-            
-        # Unit-based achievements
-        if achievement["unit_id"] and achievement["unit_id"] in completed_units:
-            newly_unlocked.append(achievement["id"])
-            
-        # Streak achievements
-        if achievement["id"] == "streak-starter" and progress.get("streak_days", 0) >= 3:
-            newly_unlocked.append(achievement["id"])
-        if achievement["id"] == "week-warrior" and progress.get("streak_days", 0) >= 7:
-            newly_unlocked.append(achievement["id"])
-            
-        # Pomodoro achievement
-        if achievement["id"] == "pomodoro-pro" and progress.get("pomodoro_sessions", 0) >= 10:
-            newly_unlocked.append(achievement["id"])
-            
-        # Subject completion
-        if achievement["id"] == "subject-scholar":
-            for subject_key, subject_data in SUBJECTS_DATA.items():
-                subject_unit_ids = {u["id"] for u in subject_data["units"]}
-                if subject_unit_ids.issubset(completed_units):
-                    newly_unlocked.append(achievement["id"])
-                    break
-                    
-        # All subjects completion
-        if achievement["id"] == "ultimate-achiever":
-            all_units = set()
-            for subject_data in SUBJECTS_DATA.values():
-                all_units.update(u["id"] for u in subject_data["units"])
-            if all_units.issubset(completed_units):
-                newly_unlocked.append(achievement["id"])
-    
-    return list(set(newly_unlocked))
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
 
-# === API ROUTES ===
-@api_router.get("/")
-async def root():
-    return {"message": "Study Tracker API"}
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
 
-@api_router.get("/subjects")
-async def get_subjects():
-    """Get all subjects with their units"""
-    progress = await get_or_create_progress()
-    completed_units = set(progress.get("completed_units", []))
-    
-    subjects = []
-    for subject_key, subject_data in SUBJECTS_DATA.items():
-        units = subject_data["units"]
-        subject_completed = sum(1 for u in units if u["id"] in completed_units)
-        subjects.append({
-            "name": subject_data["name"],
-            "color": subject_data["color"],
-            "image": subject_data["image"],
-            "units": units,
-            "completed_units": subject_completed,
-            "total_units": len(units),
-            "progress_percentage": round((subject_completed / len(units)) * 100, 1) if units else 0
-        })
-    
-    return subjects
+def send_json(request: Request, key: tuple, build: Callable[[], bytes], headers: Dict[str, str]) -> Response:
+    """Serve a JSON body from the response cache, compressed when worthwhile
 
-@api_router.get("/dashboard")
-async def get_dashboard():
-    """Get dashboard data with overall progress"""
-    progress = await get_or_create_progress()
-    completed_units = set(progress.get("completed_units", []))
+    The body and each compressed variant are cached under `key`, so a
+    given version is encoded and compressed at most once per coding.
+    A compressed variant is sent with its own ETag (see variant_etag).
+    """
+    body = response_cache.get(key)
+    if body is None:
+        with timed_span("render"):
+            body = build()
+        response_cache.put(key, body)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        compressed = response_cache.get(key + (encoding,))
+        if compressed is None:
+            with timed_span("compress"):
+                compressed = compress(body, encoding)
+            response_cache.put(key + (encoding,), compressed)
+        body = compressed
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = variant_etag(headers["ETag"], encoding)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def cached_json_response(request: Request, user_id: str, route: str, progress: dict, build) -> Response:
+    """Serve `build(progress)` as JSON, reusing cached bodies and answering 304s
+
+    `build` may return RawJSON, which is sent without re-encoding.
+    """
+    version = progress.get("version", 0)
+    # Bodies embed the curriculum, so a swap must change their keys too
+    route = f"{route}@curriculum:{curriculum.version}"
+    etag = make_etag(user_id, version, route)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization, X-User-Id, Accept-Encoding"
+    }
+    matched = matching_etag(request.headers.get("if-none-match"), etag)
+    if matched:
+        # Revalidates the variant the client holds
+        return Response(status_code=304, headers={**headers, "ETag": matched})
     
-    # Calculate totals
-    total_units = sum(len(s["units"]) for s in SUBJECTS_DATA.values())
-    total_completed = len(completed_units)
+    def render() -> bytes:
+        content = build(progress)
+        return content if isinstance(content, RawJSON) else json_bytes(content)
     
-    subjects = []
-    for subject_key, subject_data in SUBJECTS_DATA.items():
-        units = subject_data["units"]
-        subject_completed = sum(1 for u in units if u["id"] in completed_units)
-        subjects.append({
-            "name": subject_data["name"],
-            "color": subject_data["color"],
-            "image": subject_data["image"],
-            "units": units,
-            "completed_units": subject_completed,
-            "total_units": len(units),
-            "progress_percentage": round((subject_completed / len(units)) * 100, 1) if units else 0
-        })
+    return send_json(request, (user_id, version, route), render, headers)
+
+async def get_user_id(
+    x_user_id: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None)
+) -> str:
+    """Resolve the calling user from a bearer token or the X-User-Id header"""
+    if JWT_SECRET:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Missing bearer token")
+        try:
+            user_id = jwt.decode(token, JWT_SECRET, algorithms=["HS256"]).get("sub")
+        except jwt.PyJWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    else:
+        user_id = x_user_id or DEFAULT_USER_ID
+    if not isinstance(user_id, str) or not USER_ID_PATTERN.match(user_id):
+        raise HTTPException(status_code=400, detail="Invalid user id")
+    return user_id
+
+async def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """Route dependency for /api/admin: a bearer token matching ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+async def get_stream_user_id(
+    x_user_id: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None),
+    user: Optional[str] = None,
+    access_token: Optional[str] = None
+) -> str:
+    """get_user_id for EventSource clients, which cannot set headers
+
+    The user id and bearer token may be passed as the `user` and
+    `access_token` query parameters instead.
+    """
+    if access_token and not authorization:
+        authorization = f"Bearer {access_token}"
+    return await get_user_id(x_user_id or user, authorization)
+
+# === PROGRESS FOLDING ===
+# Pure-Python progress transitions. They replay the event log and back the
+# non-Mongo storage engines; the Mongo engine runs the equivalent update
+# pipeline below server-side.
+class Mutation(NamedTuple):
+    kind: str                  # "toggle" or "pomodoro"
+    unit_id: Optional[str] = None
+    key: Optional[str] = None  # idempotency key; None always applies
+    duration_minutes: Optional[int] = None
+
+def empty_progress_fields() -> dict:
+    return {
+        "completed_units": [],
+        "xp": 0,
+        "subject_xp": curriculum.subject_xp(()),
+        "level": 1,
+        "streak_days": 0,
+        "last_study_date": None,
+        "pomodoro_sessions": 0,
+        "unlocked_achievements": []
+    }
+
+def previous_day(day: str) -> str:
+    return (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+
+def streak_as_of(streak: int, last_study_date: Optional[str], day: str) -> int:
+    """The streak still standing on `day`: it lapses once a whole day passes without study
+
+    ISO dates compare lexicographically, so this (and streak_expr and
+    the expire_streaks job) compare date strings against previous_day.
+    """
+    if last_study_date is None or last_study_date < previous_day(day):
+        return 0
+    return streak
+
+def advance_streak(streak: int, last_study_date: Optional[str], day: str) -> int:
+    """Streak after studying on `day`; the Python twin of streak_expr"""
+    if last_study_date is not None and last_study_date >= day:
+        return streak
+    return streak_as_of(streak, last_study_date, day) + 1
+
+def apply_event(progress: dict, event: dict) -> Tuple[List[str], List[str]]:
+    """Fold one event into `progress` in place, mirroring mutation_pipeline
+
+    Returns the changed fields and newly completed units for achievement
+    evaluation. Events for units no longer in the catalog are ignored.
+    """
+    kind = event["type"]
+    if kind == "reset":
+        progress.update(empty_progress_fields())
+        return [], []
+    if kind == "baseline":
+        progress.update({k: v for k, v in event["snapshot"].items() if k in progress})
+        return list(curriculum.rules_by_field), list(progress["completed_units"])
+    if kind == "pomodoro":
+        progress["pomodoro_sessions"] += 1
+        progress["streak_days"] = advance_streak(progress["streak_days"], progress["last_study_date"], event["day"])
+        progress["last_study_date"] = event["day"]
+        return ["pomodoro_sessions", "streak_days"], []
     
+    unit_id = event.get("unit_id")
+    unit = curriculum.unit_index.get(unit_id)
+    if unit is None:
+        return [], []
+    if unit_id in progress["completed_units"]:
+        progress["completed_units"].remove(unit_id)
+        progress["xp"] = max(0, progress["xp"] - unit.xp)
+        return ["completed_units"], []
+    progress["completed_units"].append(unit_id)
+    progress["xp"] += unit.xp
+    progress["streak_days"] = advance_streak(progress["streak_days"], progress["last_study_date"], event["day"])
+    progress["last_study_date"] = event["day"]
+    return ["completed_units", "streak_days"], [unit_id]
+
+def fold_mutations(progress: dict, mutations: List[Mutation], write_id: Optional[str] = None) -> dict:
+    """Apply mutations to a full progress document in place (see mutation_pipeline)"""
+    write_id = write_id or uuid.uuid4().hex
+    day = date.today().isoformat()
+    next_version = progress["version"] + 1
+    applied_keys = {op["key"] for op in progress["applied_ops"]}
+    changed = False
+    for mutation in mutations:
+        if mutation.key is not None:
+            if mutation.key in applied_keys:
+                continue
+            applied_keys.add(mutation.key)
+            progress["applied_ops"].append({"key": mutation.key, "write_id": write_id})
+        apply_event(progress, {"type": mutation.kind, "unit_id": mutation.unit_id, "day": day})
+        changed = True
+    progress["subject_xp"] = curriculum.subject_xp(progress["completed_units"])
+    progress["level"] = calculate_level(progress["xp"])
+    progress["applied_ops"] = progress["applied_ops"][-IDEMPOTENCY_WINDOW:]
+    if changed:
+        progress["version"] = next_version
+        progress["updated_at"] = datetime.now(timezone.utc).isoformat()
+    return progress
+
+def replay_events(user_id: str, events: Iterable[dict]) -> dict:
+    """Rebuild a user's progress fields by folding their events in order
+
+    Events repeating an idempotency key (a resent batch) are applied once,
+    and achievements stay unlocked once earned, as on the live path.
+    """
+    progress = {"user_id": user_id, **empty_progress_fields()}
+    seen_keys = set()
+    for event in events:
+        key = event.get("key")
+        if key is not None:
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+        changed_fields, new_units = apply_event(progress, event)
+        if changed_fields:
+            progress["unlocked_achievements"] += check_and_unlock_achievements(progress, changed_fields, new_units)
+    # As the expire_streaks job would have left it
+    progress["streak_days"] = streak_as_of(progress["streak_days"], progress["last_study_date"], date.today().isoformat())
+    progress["subject_xp"] = curriculum.subject_xp(progress["completed_units"])
+    progress["level"] = calculate_level(progress["xp"])
+    return progress
+
+# === MONGO UPDATE PIPELINES ===
+def progress_defaults_stage(user_id: str) -> dict:
+    """Pipeline stage that fills in UserProgress defaults, so upserts start from a complete document"""
+    defaults = UserProgress(user_id=user_id).model_dump()
+    return {"$set": {
+        field: {"$ifNull": [f"${field}", {"$literal": value}]}
+        for field, value in defaults.items()
+    }}
+
+def level_stage() -> dict:
+    """Pipeline stage that derives `level` from `xp` (mirrors calculate_level)"""
+    return {"$set": {"level": {"$max": [
+        1,
+        {"$add": [{"$toInt": {"$floor": {"$divide": ["$xp", 500]}}}, 1]}
+    ]}}}
+
+def subject_xp_stage(cur: Curriculum) -> dict:
+    """Pipeline stage that derives `subject_xp` from `completed_units` (mirrors Curriculum.subject_xp)"""
+    return {"$set": {"subject_xp": {
+        subject_key: {"$sum": [
+            {"$cond": [{"$in": [unit_id, "$completed_units"]}, cur.unit_index[unit_id].xp, 0]}
+            for unit_id in sorted(unit_ids)
+        ]}
+        for subject_key, unit_ids in cur.subject_unit_ids.items()
+    }}}
+
+def streak_expr(today: str) -> dict:
+    """Aggregation expression for the streak after studying `today` (see advance_streak)
+
+    Yesterday extends the streak, a same-day study keeps it and any older
+    (or missing) date restarts it at 1.
+    """
+    yesterday = previous_day(today)
+    return {"$switch": {
+        "branches": [
+            {"case": {"$eq": ["$last_study_date", None]}, "then": 1},
+            {"case": {"$eq": ["$last_study_date", yesterday]}, "then": {"$add": ["$streak_days", 1]}},
+            {"case": {"$lt": ["$last_study_date", yesterday]}, "then": 1},
+        ],
+        "default": "$streak_days"
+    }}
+
+def mutation_pipeline(
+    user_id: str, mutations: List[Mutation], write_id: Optional[str] = None, outbox: List[dict] = ()
+) -> List[dict]:
+    """Update pipeline applying `mutations` in order as one atomic write
+
+    A mutation with an idempotency key is skipped when the key is already
+    in `applied_ops`; otherwise the key is recorded with `write_id`, which
+    is how callers tell the ops this write applied from resent ones.
+    `outbox` events are added to `pending_events` in the same write.
+    """
+    write_id = write_id or uuid.uuid4().hex
+    cur = curriculum
+    today = date.today().isoformat()
+    next_version = {"$add": ["$version", 1]}
+    stages = [progress_defaults_stage(user_id), {"$set": {"_changed": {"$literal": False}}}]
+    for mutation in mutations:
+        if mutation.key is None:
+            stages.append({"$set": {"_applying": {"$literal": True}, "_changed": {"$literal": True}}})
+        else:
+            is_new = {"$not": [{"$in": [{"$literal": mutation.key}, "$applied_ops.key"]}]}
+            stages.append({"$set": {
+                "_applying": is_new,
+                "_changed": {"$or": ["$_changed", is_new]},
+                "applied_ops": {"$cond": [
+                    is_new,
+                    {"$concatArrays": [
+                        "$applied_ops",
+                        [{"key": {"$literal": mutation.key}, "write_id": write_id}]
+                    ]},
+                    "$applied_ops"
+                ]}
+            }})
+
+        if mutation.kind == "toggle":
+            unit_id = mutation.unit_id
+            unit = cur.unit_index.get(unit_id)
+            if unit is None:
+                # Removed from the curriculum since the request was validated
+                continue
+            unit_xp = unit.xp
+            is_done = {"$in": [unit_id, "$completed_units"]}
+            completing = {"$and": ["$_applying", {"$not": [is_done]}]}
+            uncompleting = {"$and": ["$_applying", is_done]}
+            stages.append({"$set": {
+                "completed_units": {"$switch": {"branches": [
+                    {"case": completing, "then": {"$concatArrays": ["$completed_units", [unit_id]]}},
+                    {"case": uncompleting, "then": {"$filter": {
+                        "input": "$completed_units", "cond": {"$ne": ["$$this", unit_id]}
+                    }}}
+                ], "default": "$completed_units"}},
+                "xp": {"$switch": {"branches": [
+                    {"case": completing, "then": {"$add": ["$xp", unit_xp]}},
+                    {"case": uncompleting, "then": {"$max": [0, {"$subtract": ["$xp", unit_xp]}]}}
+                ], "default": "$xp"}},
+                "streak_days": {"$cond": [completing, streak_expr(today), "$streak_days"]},
+                "last_study_date": {"$cond": [completing, today, "$last_study_date"]}
+            }})
+        else:
+            stages.append({"$set": {
+                "pomodoro_sessions": {"$cond": [
+                    "$_applying", {"$add": ["$pomodoro_sessions", 1]}, "$pomodoro_sessions"
+                ]},
+                "streak_days": {"$cond": ["$_applying", streak_expr(today), "$streak_days"]},
+                "last_study_date": {"$cond": ["$_applying", today, "$last_study_date"]}
+            }})
+
+    if outbox:
+        stages.append({"$set": {"pending_events": {"$concatArrays": [
+            {"$ifNull": ["$pending_events", []]}, {"$literal": list(outbox)}
+        ]}}})
+    stages += [
+        subject_xp_stage(cur),
+        level_stage(),
+        {"$set": {
+            "version": {"$cond": ["$_changed", next_version, "$version"]},
+            "updated_at": {"$cond": ["$_changed", datetime.now(timezone.utc).isoformat(), "$updated_at"]},
+            "applied_ops": {"$slice": ["$applied_ops", -IDEMPOTENCY_WINDOW]}
+        }},
+        {"$unset": ["_applying", "_changed"]}
+    ]
+    return stages
+
+# === STORAGE BACKENDS ===
+class ProgressStore(ABC):
+    """Storage engine for progress snapshots and the study event log
+
+    Mutations must be atomic per user: `apply_mutations` applies the whole
+    list or nothing, logs its events with it, and returns the post-update
+    document. `fields` limits the returned keys; None means every field
+    except `applied_ops`.
+    """
+
+    def __init__(self):
+        self._ready = False
+        self._setup_lock = asyncio.Lock()
+
+    async def setup(self) -> None:
+        """Create indexes/tables; called once per process via ensure_ready"""
+
+    async def ensure_ready(self) -> None:
+        """Run setup once, on start-up or on the first request that needs it"""
+        if self._ready:
+            return
+        async with self._setup_lock:
+            if not self._ready:
+                started = time.perf_counter()
+                await self.setup()
+                self._ready = True
+                startup_report.record_deferred("store_setup", time.perf_counter() - started)
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get_or_create(self, user_id: str, fields: Optional[Iterable[str]] = None) -> dict:
+        ...
+
+    @abstractmethod
+    async def apply_mutations(
+        self, user_id: str, mutations: List[Mutation], fields: Optional[Iterable[str]] = None,
+        write_id: Optional[str] = None, events: List[dict] = ()
+    ) -> dict:
+        """Apply `mutations` and append `events` to the study event log as one commit"""
+
+    @abstractmethod
+    async def unlock_achievements(self, user_id: str, achievement_ids: List[str]) -> List[str]:
+        """Add achievements, returning only those this call unlocked"""
+
+    @abstractmethod
+    async def reset(self, user_id: str, events: List[dict] = ()) -> None:
+        """Reset progress and append `events` as one commit, keeping the version
+        monotonic and the idempotency window"""
+
+    @abstractmethod
+    async def append_events(self, events: List[dict]) -> None:
+        ...
+
+    @abstractmethod
+    def iter_events(self, user_id: Optional[str] = None) -> AsyncIterator[dict]:
+        """Events ordered by (user_id, ts, seq)"""
+
+    @abstractmethod
+    def iter_progress(self) -> AsyncIterator[dict]:
+        ...
+
+    @abstractmethod
+    async def has_events(self, user_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def write_snapshots(self, snapshots: List[dict]) -> Dict[int, str]:
+        """Overwrite progress fields with replayed or imported state, bumping versions
+
+        Snapshots are written independently; returns the errors of those
+        that failed, keyed by their index in `snapshots`.
+        """
+
+    @abstractmethod
+    async def expire_streaks(self, cutoff: str, limit: int) -> List[str]:
+        """Zero up to `limit` streaks last extended before `cutoff`, returning their user ids
+
+        Lapsed streaks are found through an index on `last_study_date`
+        covering only active streaks, so a run with nothing to expire
+        costs one empty index range scan.
+        """
+
+    async def sync_curriculum(self, cur: Curriculum) -> None:
+        """Re-derive curriculum-dependent fields and indexes after a curriculum change
+
+        Runs once per new version: as a background job after a hot swap,
+        and from `python server.py setup` at deploy time. Documents are
+        rewritten JOB_CHUNK_SIZE at a time, yielding to requests between
+        chunks.
+        """
+
+    @abstractmethod
+    async def top_progress(self, scope: str, limit: int) -> List[dict]:
+        """The first `limit` leaderboard rows ({user_id, score, streak_days})
+
+        Ordered by score, then streak, descending, then user id, using
+        an index rather than a sort of the whole collection.
+        """
+
+    @abstractmethod
+    async def count_ahead(self, scope: str, score: int, streak_days: int, user_id: str) -> int:
+        """How many users rank before the given leaderboard row"""
+
+def score_field(scope: str) -> str:
+    """Progress field a leaderboard scope ranks by"""
+    return "xp" if scope == OVERALL_SCOPE else f"subject_xp.{scope}"
+
+def score_of(doc: dict, scope: str) -> int:
+    if scope == OVERALL_SCOPE:
+        return doc.get("xp", 0)
+    return doc.get("subject_xp", {}).get(scope, 0)
+
+def select_fields(doc: dict, fields: Optional[Iterable[str]]) -> dict:
+    """Copy of `doc` limited to `fields` (everything but applied_ops when None)"""
+    if fields is None:
+        return {k: copy.deepcopy(v) for k, v in doc.items() if k != "applied_ops"}
+    return {k: copy.deepcopy(doc[k]) for k in fields if k in doc}
+
+class MongoProgressStore(ProgressStore):
+    """Motor-backed store; mutations run as server-side update pipelines"""
+
+    def __init__(self, mongo_url: str, db_name: str, create_indexes: bool = True):
+        super().__init__()
+        self.mongo_url = mongo_url
+        self.db_name = db_name
+        self.create_indexes = create_indexes
+        self.client = None
+        self._drains: Set[asyncio.Task] = set()
+
+    @property
+    def db(self):
+        # Motor and its connection pool are only set up on first use, then
+        # reused for the life of the process (warm serverless invocations)
+        if self.client is None:
+            started = time.perf_counter()
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self.client = AsyncIOMotorClient(self.mongo_url)
+            startup_report.record_deferred("mongo_client", time.perf_counter() - started)
+        return self.client[self.db_name]
+
+    @staticmethod
+    def projection(fields: Optional[Iterable[str]], outbox: bool = False) -> dict:
+        if fields is None:
+            return {"_id": 0, "applied_ops": 0} if outbox else {"_id": 0, "applied_ops": 0, "pending_events": 0}
+        return {"_id": 0, **{f: 1 for f in fields}, **({"pending_events": 1} if outbox else {})}
+
+    async def setup(self) -> None:
+        # Documents from the single-user era have no user_id; adopt the first
+        # one as the default user's progress before enforcing uniqueness.
+        # Both are no-ops once done, so cold starts run them on their first
+        # request too: without the unique index, concurrent first writes for
+        # a user would upsert duplicate documents.
+        with db_timer("update_one", "user_progress"):
+            await self.db.user_progress.update_one(
+                {"user_id": {"$exists": False}},
+                {"$set": {"user_id": DEFAULT_USER_ID}}
+            )
+        with db_timer("create_index", "user_progress"):
+            await self.db.user_progress.create_index("user_id", unique=True)
+        # The rest can scan every document, so cold starts leave it to
+        # `python server.py setup` at deploy time
+        if not self.create_indexes:
+            return
+        with db_timer("create_index", "study_events"):
+            await self.db.study_events.create_index([("user_id", 1), ("ts", 1), ("seq", 1)])
+        with db_timer("create_index", "user_progress"):
+            await self.db.user_progress.create_index(
+                [("last_study_date", 1)], partialFilterExpression={"streak_days": {"$gt": 0}}
+            )
+        if CURRICULUM_SOURCE == "mongo":
+            with db_timer("create_index", "curriculum"):
+                await self.db.curriculum.create_index([("version", -1)], unique=True)
+        # Documents written before subject_xp existed get it derived once
+        cur = curriculum
+        with db_timer("update_many", "user_progress"):
+            await self.db.user_progress.update_many({"subject_xp": {"$exists": False}}, [subject_xp_stage(cur)])
+        await self.create_rank_indexes(cur)
+
+    async def create_rank_indexes(self, cur: Curriculum) -> None:
+        for scope in cur.leaderboard_scopes:
+            with db_timer("create_index", "user_progress"):
+                await self.db.user_progress.create_index(self.rank_order(scope))
+
+    async def sync_curriculum(self, cur):
+        await self.create_rank_indexes(cur)
+        stage = subject_xp_stage(cur)
+        after = ""
+        while True:
+            with db_timer("find", "user_progress"):
+                docs = await self.db.user_progress.find(
+                    {"user_id": {"$gt": after}}, {"_id": 0, "user_id": 1}
+                ).sort("user_id", 1).limit(JOB_CHUNK_SIZE).to_list(length=JOB_CHUNK_SIZE)
+            if not docs:
+                break
+            user_ids = [doc["user_id"] for doc in docs]
+            with db_timer("update_many", "user_progress"):
+                await self.db.user_progress.update_many({"user_id": {"$in": user_ids}}, [stage])
+            after = user_ids[-1]
+            await asyncio.sleep(0)
+
+    @staticmethod
+    def rank_order(scope: str) -> List[Tuple[str, int]]:
+        return [(score_field(scope), -1), ("streak_days", -1), ("user_id", 1)]
+
+    async def close(self) -> None:
+        if self._drains:
+            await asyncio.gather(*self._drains, return_exceptions=True)
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    async def get_or_create(self, user_id, fields=None):
+        # Creation is an upsert against the unique user_id index, so concurrent
+        # first requests for a user end up sharing a single document
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+        projection = self.projection(fields)
+        with db_timer("find_one", "user_progress"):
+            progress = await self.db.user_progress.find_one({"user_id": user_id}, projection)
+        if progress:
+            return progress
+        defaults = UserProgress(user_id=user_id).model_dump(exclude={"user_id"})
+        try:
+            with db_timer("find_one_and_update", "user_progress"):
+                return await self.db.user_progress.find_one_and_update(
+                    {"user_id": user_id},
+                    {"$setOnInsert": defaults},
+                    projection=projection,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+        except DuplicateKeyError:
+            # Lost the insert race to a concurrent request; its document wins
+            with db_timer("find_one", "user_progress"):
+                return await self.db.user_progress.find_one({"user_id": user_id}, projection)
+
+    async def apply_mutations(self, user_id, mutations, fields=None, write_id=None, events=()):
+        from pymongo import ReturnDocument
+        write_id = write_id or uuid.uuid4().hex
+        # Without multi-document transactions, events commit with the snapshot
+        # in an outbox on the document and are moved to study_events after.
+        # Ids derived from the write make moving them again a no-op.
+        outbox = [{"_id": f"{write_id}:{event['seq']}", **event} for event in events]
+        pipeline = mutation_pipeline(user_id, mutations, write_id, outbox)
+        with db_timer("find_one_and_update", "user_progress"):
+            progress = await self.db.user_progress.find_one_and_update(
+                {"user_id": user_id},
+                pipeline,
+                projection=self.projection(fields, outbox=True),
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        pending = progress.pop("pending_events", None)
+        if pending:
+            self.drain_outbox(user_id, pending)
+        return progress
+
+    def drain_outbox(self, user_id: str, events: List[dict]) -> None:
+        """Move committed outbox events to study_events in the background
+
+        Keeps the write itself at one round-trip. The events are already
+        durable, so a failed move is only logged: the next write, or
+        flush_outboxes before the log is read, moves them.
+        """
+        async def drain():
+            try:
+                await self.flush_outbox(user_id, events)
+            except Exception:
+                logger.exception("Could not move %d study events for %s out of the outbox", len(events), user_id)
+        task = asyncio.create_task(drain())
+        self._drains.add(task)
+        task.add_done_callback(self._drains.discard)
+
+    async def flush_outbox(self, user_id: str, events: List[dict]) -> None:
+        from pymongo.errors import BulkWriteError
+        try:
+            with db_timer("insert_many", "study_events"):
+                await self.db.study_events.insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate ids were moved by an earlier, interrupted flush
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        with db_timer("update_one", "user_progress"):
+            await self.db.user_progress.update_one(
+                {"user_id": user_id},
+                {"$pull": {"pending_events": {"_id": {"$in": [event["_id"] for event in events]}}}}
+            )
+
+    async def flush_outboxes(self, user_id: Optional[str] = None) -> None:
+        """Move events left in outboxes by failed flushes, before the log is read"""
+        query = {"pending_events.0": {"$exists": True}}
+        if user_id:
+            query["user_id"] = user_id
+        async for doc in self.db.user_progress.find(query, {"_id": 0, "user_id": 1, "pending_events": 1}):
+            await self.flush_outbox(doc["user_id"], doc["pending_events"])
+
+    async def unlock_achievements(self, user_id, achievement_ids):
+        from pymongo import ReturnDocument
+        with db_timer("find_one_and_update", "user_progress"):
+            before = await self.db.user_progress.find_one_and_update(
+                {"user_id": user_id},
+                {"$addToSet": {"unlocked_achievements": {"$each": achievement_ids}}, "$inc": {"version": 1}},
+                projection={"_id": 0, "unlocked_achievements": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+        already_unlocked = set(before.get("unlocked_achievements", [])) if before else set()
+        return [a for a in achievement_ids if a not in already_unlocked]
+
+    async def reset(self, user_id, events=()):
+        from pymongo import ReturnDocument
+        write_id = uuid.uuid4().hex
+        outbox = [{"_id": f"{write_id}:{event['seq']}", **event} for event in events]
+        doc = UserProgress(user_id=user_id).model_dump(exclude={"user_id", "version", "applied_ops"})
+        with db_timer("find_one_and_update", "user_progress"):
+            progress = await self.db.user_progress.find_one_and_update(
+                {"user_id": user_id},
+                {"$set": doc, "$inc": {"version": 1}, "$push": {"pending_events": {"$each": outbox}}},
+                projection={"_id": 0, "pending_events": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        if progress.get("pending_events"):
+            self.drain_outbox(user_id, progress["pending_events"])
+
+    async def append_events(self, events):
+        with db_timer("insert_many", "study_events"):
+            await self.db.study_events.insert_many(events, ordered=True)
+
+    async def iter_events(self, user_id=None):
+        await self.flush_outboxes(user_id)
+        query = {"user_id": user_id} if user_id else {}
+        cursor = self.db.study_events.find(query, {"_id": 0}).sort([("user_id", 1), ("ts", 1), ("seq", 1)])
+        async for event in cursor:
+            yield event
+
+    async def iter_progress(self):
+        async for progress in self.db.user_progress.find({}, self.projection(None)):
+            yield progress
+
+    async def has_events(self, user_id):
+        with db_timer("find_one", "study_events"):
+            return await self.db.study_events.find_one({"user_id": user_id}, {"_id": 1}) is not None
+
+    async def write_snapshots(self, snapshots):
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+        now = datetime.now(timezone.utc).isoformat()
+        operations = [
+            UpdateOne(
+                {"user_id": snapshot["user_id"]},
+                {
+                    "$set": {**snapshot, "updated_at": now},
+                    # Imported snapshots may carry their own id and created_at
+                    "$setOnInsert": UserProgress(user_id=snapshot["user_id"]).model_dump(
+                        include={"id", "created_at", "applied_ops"} - snapshot.keys()
+                    ),
+                    "$inc": {"version": 1}
+                },
+                upsert=True
+            )
+            for snapshot in snapshots
+        ]
+        try:
+            with db_timer("bulk_write", "user_progress"):
+                await self.db.user_progress.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            return {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+        return {}
+
+    async def expire_streaks(self, cutoff, limit):
+        lapsed = {"streak_days": {"$gt": 0}, "last_study_date": {"$lt": cutoff}}
+        with db_timer("find", "user_progress"):
+            docs = await self.db.user_progress.find(lapsed, {"_id": 0, "user_id": 1}).limit(limit).to_list(length=limit)
+        user_ids = [doc["user_id"] for doc in docs]
+        if user_ids:
+            # Re-checks the filter, so a user studying meanwhile keeps their streak
+            with db_timer("update_many", "user_progress"):
+                await self.db.user_progress.update_many(
+                    {**lapsed, "user_id": {"$in": user_ids}},
+                    {"$set": {"streak_days": 0, "updated_at": datetime.now(timezone.utc).isoformat()}, "$inc": {"version": 1}}
+                )
+        return user_ids
+
+    async def top_progress(self, scope, limit):
+        field = score_field(scope)
+        cursor = self.db.user_progress.find(
+            {}, {"_id": 0, "user_id": 1, "streak_days": 1, field: 1}
+        ).sort(self.rank_order(scope)).limit(limit)
+        with db_timer("find", "user_progress"):
+            docs = await cursor.to_list(length=limit)
+        return [
+            {"user_id": doc["user_id"], "score": score_of(doc, scope), "streak_days": doc.get("streak_days", 0)}
+            for doc in docs
+        ]
+
+    async def count_ahead(self, scope, score, streak_days, user_id):
+        field = score_field(scope)
+        with db_timer("count_documents", "user_progress"):
+            return await self.db.user_progress.count_documents({"$or": [
+                {field: {"$gt": score}},
+                {field: score, "streak_days": {"$gt": streak_days}},
+                {field: score, "streak_days": streak_days, "user_id": {"$lt": user_id}}
+            ]})
+
+class MemoryProgressStore(ProgressStore):
+    """In-process store for single-node runs, benchmarks and tests
+
+    No method awaits between reading and writing a document, so every
+    mutation is atomic on the event loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.progress: Dict[str, dict] = {}
+        self.events: Dict[str, List[dict]] = {}
+
+    def _doc(self, user_id: str) -> dict:
+        doc = self.progress.get(user_id)
+        if doc is None:
+            doc = self.progress[user_id] = UserProgress(user_id=user_id).model_dump()
+        return doc
+
+    async def get_or_create(self, user_id, fields=None):
+        return select_fields(self._doc(user_id), fields)
+
+    async def apply_mutations(self, user_id, mutations, fields=None, write_id=None, events=()):
+        self._append(events)
+        return select_fields(fold_mutations(self._doc(user_id), mutations, write_id), fields)
+
+    async def unlock_achievements(self, user_id, achievement_ids):
+        doc = self._doc(user_id)
+        newly_unlocked = [a for a in achievement_ids if a not in doc["unlocked_achievements"]]
+        doc["unlocked_achievements"] += newly_unlocked
+        doc["version"] += 1
+        return newly_unlocked
+
+    async def reset(self, user_id, events=()):
+        self._append(events)
+        doc = self._doc(user_id)
+        doc.update(UserProgress(user_id=user_id).model_dump(exclude={"version", "applied_ops"}))
+        doc["version"] += 1
+
+    def _append(self, events: Iterable[dict]) -> None:
+        for event in events:
+            self.events.setdefault(event["user_id"], []).append(copy.deepcopy(event))
+
+    async def append_events(self, events):
+        self._append(events)
+
+    async def iter_events(self, user_id=None):
+        user_ids = [user_id] if user_id else sorted(self.events)
+        for uid in user_ids:
+            for event in sorted(self.events.get(uid, []), key=lambda e: (e["ts"], e["seq"])):
+                yield copy.deepcopy(event)
+
+    async def iter_progress(self):
+        for doc in list(self.progress.values()):
+            yield select_fields(doc, None)
+
+    async def has_events(self, user_id):
+        return bool(self.events.get(user_id))
+
+    async def write_snapshots(self, snapshots):
+        now = datetime.now(timezone.utc).isoformat()
+        for snapshot in snapshots:
+            doc = self._doc(snapshot["user_id"])
+            doc.update(copy.deepcopy(snapshot), updated_at=now)
+            doc["version"] += 1
+        return {}
+
+    async def sync_curriculum(self, cur):
+        for doc in self.progress.values():
+            doc["subject_xp"] = cur.subject_xp(doc["completed_units"])
+
+    async def expire_streaks(self, cutoff, limit):
+        now = datetime.now(timezone.utc).isoformat()
+        lapsed = [
+            doc for doc in self.progress.values()
+            if doc["streak_days"] > 0 and doc["last_study_date"] is not None and doc["last_study_date"] < cutoff
+        ][:limit]
+        for doc in lapsed:
+            doc.update(streak_days=0, updated_at=now)
+            doc["version"] += 1
+        return [doc["user_id"] for doc in lapsed]
+
+    # Leaderboards scan every document; fine at the scale this engine serves
+    async def top_progress(self, scope, limit):
+        ranked = sorted(
+            self.progress.values(),
+            key=lambda doc: leaderboard_key(doc["user_id"], score_of(doc, scope), doc["streak_days"])
+        )
+        return [
+            {"user_id": doc["user_id"], "score": score_of(doc, scope), "streak_days": doc["streak_days"]}
+            for doc in ranked[:limit]
+        ]
+
+    async def count_ahead(self, scope, score, streak_days, user_id):
+        key = leaderboard_key(user_id, score, streak_days)
+        return sum(
+            1 for doc in self.progress.values()
+            if leaderboard_key(doc["user_id"], score_of(doc, scope), doc["streak_days"]) < key
+        )
+
+class SqliteProgressStore(ProgressStore):
+    """aiosqlite-backed store for single-node and edge deployments
+
+    Progress documents are stored as JSON rows. Mutations run inside
+    BEGIN IMMEDIATE transactions, which also makes them atomic across
+    processes sharing the database file.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.conn = None
+        self._lock = asyncio.Lock()
+
+    async def setup(self) -> None:
+        import aiosqlite
+        self.conn = await aiosqlite.connect(self.path, isolation_level=None)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_progress (user_id TEXT PRIMARY KEY, doc TEXT NOT NULL)"
+        )
+        await self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS study_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "ts TEXT NOT NULL, seq INTEGER NOT NULL, doc TEXT NOT NULL)"
+        )
+        await self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS study_events_user_ts ON study_events (user_id, ts, seq)"
+        )
+        await self.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS user_progress_streaks ON user_progress ({self.LAST_STUDY_SQL}) "
+            f"WHERE {self.STREAK_SQL} > 0"
+        )
+        # Documents written before subject_xp existed get it derived once
+        await self.derive_subject_xp(curriculum, "json_extract(doc, '$.subject_xp') IS NULL")
+        await self.create_rank_indexes(curriculum)
+
+    async def create_rank_indexes(self, cur: Curriculum) -> None:
+        for scope in cur.leaderboard_scopes:
+            name = re.sub(r"[^a-z0-9]+", "_", scope.lower())
+            await self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS user_progress_rank_{name} ON user_progress "
+                f"({self.score_sql(scope)} DESC, {self.STREAK_SQL} DESC, user_id)"
+            )
+
+    async def derive_subject_xp(self, cur: Curriculum, condition: str = "1") -> None:
+        # One short transaction per chunk, so other writes interleave
+        after = ""
+        while True:
+            async with self._transaction():
+                async with self.conn.execute(
+                    f"SELECT doc FROM user_progress WHERE user_id > ? AND ({condition}) ORDER BY user_id LIMIT ?",
+                    (after, JOB_CHUNK_SIZE)
+                ) as cursor:
+                    docs = [json.loads(row[0]) for row in await cursor.fetchall()]
+                for doc in docs:
+                    doc["subject_xp"] = cur.subject_xp(doc.get("completed_units", []))
+                    await self._save(doc)
+            if len(docs) < JOB_CHUNK_SIZE:
+                break
+            after = docs[-1]["user_id"]
+            await asyncio.sleep(0)
+
+    async def sync_curriculum(self, cur):
+        await self.create_rank_indexes(cur)
+        await self.derive_subject_xp(cur)
+
+    # Leaderboard queries must repeat these expressions verbatim to use the
+    # expression indexes created in setup
+    STREAK_SQL = "COALESCE(json_extract(doc, '$.streak_days'), 0)"
+    LAST_STUDY_SQL = "json_extract(doc, '$.last_study_date')"
+
+    @staticmethod
+    def score_sql(scope: str) -> str:
+        path = "$.xp" if scope == OVERALL_SCOPE else '$.subject_xp."{}"'.format(scope.replace("'", "''"))
+        return f"COALESCE(json_extract(doc, '{path}'), 0)"
+
+    async def close(self) -> None:
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    @asynccontextmanager
+    async def _transaction(self):
+        # One shared connection, so transactions are serialized in-process
+        async with self._lock:
+            await self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                await self.conn.execute("ROLLBACK")
+                raise
+            await self.conn.execute("COMMIT")
+
+    async def _load(self, user_id: str) -> Optional[dict]:
+        with db_timer("select", "user_progress"):
+            async with self.conn.execute("SELECT doc FROM user_progress WHERE user_id = ?", (user_id,)) as cursor:
+                row = await cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def _save(self, doc: dict) -> None:
+        with db_timer("upsert", "user_progress"):
+            await self.conn.execute(
+                "INSERT INTO user_progress (user_id, doc) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET doc = excluded.doc",
+                (doc["user_id"], json.dumps(doc))
+            )
+
+    async def _load_or_default(self, user_id: str) -> dict:
+        return await self._load(user_id) or UserProgress(user_id=user_id).model_dump()
+
+    async def get_or_create(self, user_id, fields=None):
+        doc = await self._load(user_id)
+        if doc is None:
+            async with self._transaction():
+                doc = await self._load(user_id)
+                if doc is None:
+                    doc = UserProgress(user_id=user_id).model_dump()
+                    await self._save(doc)
+        return select_fields(doc, fields)
+
+    async def apply_mutations(self, user_id, mutations, fields=None, write_id=None, events=()):
+        async with self._transaction():
+            doc = fold_mutations(await self._load_or_default(user_id), mutations, write_id)
+            await self._save(doc)
+            if events:
+                await self._insert_events(events)
+        return select_fields(doc, fields)
+
+    async def unlock_achievements(self, user_id, achievement_ids):
+        async with self._transaction():
+            doc = await self._load_or_default(user_id)
+            newly_unlocked = [a for a in achievement_ids if a not in doc["unlocked_achievements"]]
+            doc["unlocked_achievements"] += newly_unlocked
+            doc["version"] += 1
+            await self._save(doc)
+        return newly_unlocked
+
+    async def reset(self, user_id, events=()):
+        async with self._transaction():
+            doc = await self._load_or_default(user_id)
+            doc.update(UserProgress(user_id=user_id).model_dump(exclude={"version", "applied_ops"}))
+            doc["version"] += 1
+            await self._save(doc)
+            if events:
+                await self._insert_events(events)
+
+    async def _insert_events(self, events: List[dict]) -> None:
+        with db_timer("insert", "study_events"):
+            await self.conn.executemany(
+                "INSERT INTO study_events (user_id, ts, seq, doc) VALUES (?, ?, ?, ?)",
+                [(e["user_id"], e["ts"], e["seq"], json.dumps(e)) for e in events]
+            )
+
+    async def append_events(self, events):
+        async with self._transaction():
+            await self._insert_events(events)
+
+    async def iter_events(self, user_id=None):
+        query = "SELECT doc FROM study_events"
+        params: tuple = ()
+        if user_id:
+            query += " WHERE user_id = ?"
+            params = (user_id,)
+        async with self.conn.execute(query + " ORDER BY user_id, ts, seq", params) as cursor:
+            async for row in cursor:
+                yield json.loads(row[0])
+
+    async def iter_progress(self):
+        async with self.conn.execute("SELECT doc FROM user_progress") as cursor:
+            async for row in cursor:
+                yield select_fields(json.loads(row[0]), None)
+
+    async def has_events(self, user_id):
+        async with self.conn.execute("SELECT 1 FROM study_events WHERE user_id = ? LIMIT 1", (user_id,)) as cursor:
+            return await cursor.fetchone() is not None
+
+    async def write_snapshots(self, snapshots):
+        import sqlite3
+        now = datetime.now(timezone.utc).isoformat()
+        errors: Dict[int, str] = {}
+        # One transaction for the batch, with a savepoint per snapshot so a
+        # failed one is rolled back alone
+        async with self._transaction():
+            for index, snapshot in enumerate(snapshots):
+                await self.conn.execute("SAVEPOINT snapshot")
+                try:
+                    doc = await self._load_or_default(snapshot["user_id"])
+                    doc.update(snapshot, updated_at=now)
+                    doc["version"] += 1
+                    await self._save(doc)
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    await self.conn.execute("ROLLBACK TO snapshot")
+                    errors[index] = str(e)
+                await self.conn.execute("RELEASE snapshot")
+        return errors
+
+    async def expire_streaks(self, cutoff, limit):
+        now = datetime.now(timezone.utc).isoformat()
+        async with self._transaction():
+            with db_timer("select", "user_progress"):
+                async with self.conn.execute(
+                    f"SELECT doc FROM user_progress WHERE {self.STREAK_SQL} > 0 AND {self.LAST_STUDY_SQL} < ? LIMIT ?",
+                    (cutoff, limit)
+                ) as cursor:
+                    docs = [json.loads(row[0]) for row in await cursor.fetchall()]
+            for doc in docs:
+                doc.update(streak_days=0, updated_at=now)
+                doc["version"] += 1
+                await self._save(doc)
+        return [doc["user_id"] for doc in docs]
+
+    async def top_progress(self, scope, limit):
+        score = self.score_sql(scope)
+        query = (
+            f"SELECT user_id, {score}, {self.STREAK_SQL} FROM user_progress "
+            f"ORDER BY {score} DESC, {self.STREAK_SQL} DESC, user_id LIMIT ?"
+        )
+        with db_timer("select", "user_progress"):
+            async with self.conn.execute(query, (limit,)) as cursor:
+                rows = await cursor.fetchall()
+        return [{"user_id": row[0], "score": row[1], "streak_days": row[2]} for row in rows]
+
+    async def count_ahead(self, scope, score, streak_days, user_id):
+        score_sql, streak_sql = self.score_sql(scope), self.STREAK_SQL
+        query = (
+            f"SELECT COUNT(*) FROM user_progress WHERE {score_sql} > ? "
+            f"OR ({score_sql} = ? AND {streak_sql} > ?) "
+            f"OR ({score_sql} = ? AND {streak_sql} = ? AND user_id < ?)"
+        )
+        with db_timer("count", "user_progress"):
+            async with self.conn.execute(query, (score, score, streak_days, score, streak_days, user_id)) as cursor:
+                return (await cursor.fetchone())[0]
+
+def create_store(backend: str) -> ProgressStore:
+    if backend == "mongo":
+        return MongoProgressStore(os.environ['MONGO_URL'], os.environ['DB_NAME'], create_indexes=not COLD_START_MODE)
+    if backend == "sqlite":
+        return SqliteProgressStore(SQLITE_PATH)
+    if backend == "memory":
+        return MemoryProgressStore()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+store = create_store(STORAGE_BACKEND)
+startup_report.mark("store")
+
+async def store_ready() -> None:
+    """Route dependency that sets the store up if start-up hooks never ran"""
+    await store.ensure_ready()
+
+# === PROGRESS STREAM ===
+class ProgressBroker:
+    """In-process fan-out of progress deltas to stream subscribers
+
+    Each subscriber owns a bounded queue, so an idle tab costs one queue
+    and a parked coroutine. Publishing never blocks: a subscriber that
+    falls behind has its backlog dropped and is told to resync instead.
+    Subscribers only see mutations handled by this process.
+    """
+
+    RESYNC = ("sync", None)
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return user_id in self._subscribers
+
+    def publish(self, user_id: str, event: str, data: Optional[dict]) -> None:
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.RESYNC)
+
+progress_broker = ProgressBroker(STREAM_QUEUE_SIZE)
+
+def stats_delta(progress: dict) -> dict:
     xp = progress.get("xp", 0)
-    
     return {
+        "version": progress.get("version", 0),
         "xp": xp,
         "level": calculate_level(xp),
         "xp_to_next_level": xp_to_next_level(xp),
         "streak_days": progress.get("streak_days", 0),
-        "total_completed": total_completed,
-        "total_units": total_units,
-        "overall_progress": round((total_completed / total_units) * 100, 1) if total_units else 0,
-        "subjects": subjects,
-        "unlocked_achievements": progress.get("unlocked_achievements", []),
         "pomodoro_sessions": progress.get("pomodoro_sessions", 0)
     }
 
-@api_router.post("/units/toggle")
-async def toggle_unit_completion(request: ToggleUnitRequest):
-    """Toggle a unit's completion status"""
-    unit_id = request.unit_id
+def publish_mutations(user_id: str, mutations: List[Mutation], progress: dict) -> None:
+    """Push the deltas of an applied mutation list to the user's streams"""
+    if not progress_broker.has_subscribers(user_id):
+        return
+    completed_units = set(progress.get("completed_units", []))
+    units = {m.unit_id: m.unit_id in completed_units for m in mutations if m.kind == "toggle"}
+    if units:
+        progress_broker.publish(user_id, "units", {"version": progress.get("version", 0), "units": units})
+    progress_broker.publish(user_id, "stats", stats_delta(progress))
+
+async def sync_state(user_id: str) -> dict:
+    """Full compact state sent when a stream (re)synchronises"""
+    progress = await get_or_create_progress(user_id, DASHBOARD_FIELDS)
+    return {
+        **stats_delta(progress),
+        "completed_units": progress["completed_units"],
+        "unlocked_achievements": progress["unlocked_achievements"]
+    }
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json_bytes(data).decode()}\n\n"
+
+# === LEADERBOARD ===
+def leaderboard_key(user_id: str, score: int, streak_days: int) -> tuple:
+    """Sort key ranking by score, then streak, then user id for stable ties"""
+    return (-score, -streak_days, user_id)
+
+@dataclass
+class RankedScope:
+    keys: List[tuple]              # sorted leaderboard_key tuples
+    by_user: Dict[str, tuple]
+    complete: bool                 # every user fits, not just the top K
+    expires: float
+
+class Leaderboard:
+    """Cached top-K per scope, loaded from the ranked index
+
+    Writes in this process update the cached entries in place through
+    record(), so reads never wait on the store between reloads. When a
+    user drops out of a full top-K the next entry is unknown, so that
+    scope is reloaded on its next read; reloads after `ttl` pick up
+    writes made by other instances.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._scopes: Dict[str, RankedScope] = {}
+        self._load_lock = asyncio.Lock()
+
+    async def _scope(self, scope: str) -> RankedScope:
+        ranked = self._scopes.get(scope)
+        if ranked is not None and ranked.expires > time.monotonic():
+            return ranked
+        async with self._load_lock:
+            ranked = self._scopes.get(scope)
+            if ranked is None or ranked.expires <= time.monotonic():
+                rows = await store.top_progress(scope, self.size)
+                by_user = {r["user_id"]: leaderboard_key(r["user_id"], r["score"], r["streak_days"]) for r in rows}
+                ranked = self._scopes[scope] = RankedScope(
+                    keys=sorted(by_user.values()),
+                    by_user=by_user,
+                    complete=len(rows) < self.size,
+                    expires=time.monotonic() + self.ttl
+                )
+        return ranked
+
+    async def top(self, scope: str, limit: int) -> List[dict]:
+        ranked = await self._scope(scope)
+        return [
+            {"rank": rank, "user_id": user_id, "xp": -neg_score, "streak_days": -neg_streak}
+            for rank, (neg_score, neg_streak, user_id) in enumerate(ranked.keys[:limit], start=1)
+        ]
+
+    async def rank(self, scope: str, user_id: str, score: int, streak_days: int) -> int:
+        key = leaderboard_key(user_id, score, streak_days)
+        ranked = await self._scope(scope)
+        if key in ranked.by_user.values() or ranked.complete or (ranked.keys and key < ranked.keys[-1]):
+            return bisect.bisect_left(ranked.keys, key) + 1
+        return await store.count_ahead(scope, score, streak_days, user_id) + 1
+
+    def record(self, user_id: str, progress: dict) -> None:
+        """Move a user within the cached scopes after a write"""
+        if not self._scopes:
+            return
+        subject_xp = curriculum.subject_xp(progress.get("completed_units", []))
+        streak_days = progress.get("streak_days", 0)
+        for scope, ranked in list(self._scopes.items()):
+            score = progress.get("xp", 0) if scope == OVERALL_SCOPE else subject_xp.get(scope, 0)
+            key = leaderboard_key(user_id, score, streak_days)
+            old = ranked.by_user.pop(user_id, None)
+            if old is not None:
+                del ranked.keys[bisect.bisect_left(ranked.keys, old)]
+            if len(ranked.keys) < self.size and ranked.complete:
+                bisect.insort(ranked.keys, key)
+                ranked.by_user[user_id] = key
+            elif ranked.keys and key < ranked.keys[-1]:
+                bisect.insort(ranked.keys, key)
+                ranked.by_user[user_id] = key
+                if len(ranked.keys) > self.size:
+                    dropped = ranked.keys.pop()
+                    del ranked.by_user[dropped[2]]
+                    ranked.complete = False
+            elif old is not None:
+                del self._scopes[scope]
+            else:
+                # Someone now sits below a full top-K, so it no longer holds everyone
+                ranked.complete = False
+
+    def clear(self) -> None:
+        self._scopes.clear()
+
+leaderboard = Leaderboard(LEADERBOARD_SIZE, LEADERBOARD_TTL)
+
+def resolve_scope(scope: str) -> str:
+    if scope.lower() == OVERALL_SCOPE:
+        return OVERALL_SCOPE
+    subject_key = curriculum.subject_keys_by_name.get(scope.lower())
+    if subject_key is None:
+        raise HTTPException(status_code=400, detail=f"Unknown leaderboard scope: {scope}")
+    return subject_key
+
+# === PROGRESS SERVICE ===
+# Progress fields each read route uses. progress_reader always fetches
+# the whole document; these only narrow what the route's builders see.
+SUBJECTS_FIELDS = ("completed_units", "version")
+DASHBOARD_FIELDS = (
+    "completed_units", "xp", "streak_days", "unlocked_achievements",
+    "pomodoro_sessions", "version"
+)
+ACHIEVEMENTS_FIELDS = ("unlocked_achievements", "version")
+BATCH_FIELDS = tuple(UserProgress.model_fields)
+
+class ProgressReader:
+    """Single-flight, briefly cached progress reads
+
+    Concurrent reads for a user share one in-flight store fetch (which
+    also creates missing documents), and the result is reused for `ttl`
+    seconds. Writers call invalidate() after their write lands; that drops
+    the cached copy and detaches any fetch already in flight, so a read
+    that may predate the write is never cached or joined afterwards.
+    Documents handed out are shared and must not be mutated.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, user_id: str) -> dict:
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                metrics.count_progress_read("cache")
+                return cached[1]
+            del self._cache[user_id]
+        task = self._in_flight.get(user_id)
+        if task is None:
+            metrics.count_progress_read("store")
+            task = self._in_flight[user_id] = asyncio.ensure_future(self._fetch(user_id))
+        else:
+            metrics.count_progress_read("coalesced")
+        # Shielded so a caller that disconnects does not cancel the others' read
+        return await asyncio.shield(task)
+
+    async def _fetch(self, user_id: str) -> dict:
+        task = asyncio.current_task()
+        try:
+            progress = await store.get_or_create(user_id)
+        finally:
+            detached = self._in_flight.get(user_id) is not task
+            if not detached:
+                del self._in_flight[user_id]
+        if not detached:
+            # Documents can be created here, or changed by another instance
+            leaderboard.record(user_id, progress)
+            if self.ttl > 0:
+                self._cache[user_id] = (time.monotonic() + self.ttl, progress)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        return progress
+
+    def invalidate(self, user_id: str) -> None:
+        self._cache.pop(user_id, None)
+        self._in_flight.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._in_flight.clear()
+
+progress_reader = ProgressReader(PROGRESS_CACHE_TTL, PROGRESS_CACHE_SIZE)
+
+async def get_or_create_progress(user_id: str, fields: Optional[Iterable[str]] = None) -> dict:
+    """Get existing progress or create new one
+
+    Reads go through progress_reader, so the whole document is fetched
+    and then narrowed to `fields`.
+    """
+    progress = await progress_reader.get(user_id)
+    if fields is None:
+        return progress
+    return {k: progress[k] for k in fields if k in progress}
+
+async def apply_mutations(
+    user_id: str, mutations: List[Mutation], fields: Optional[Iterable[str]] = None, write_id: Optional[str] = None
+) -> dict:
+    """Apply mutations atomically to the snapshot, logging them as study events
+
+    The store commits the events with the snapshot, so the log never
+    misses a write the user saw and replaying it rebuilds the same
+    snapshot.
+    """
+    if not mutations:
+        return await store.apply_mutations(user_id, mutations, fields, write_id)
+    try:
+        progress = await store.apply_mutations(user_id, mutations, fields, write_id, mutation_events(user_id, mutations))
+    finally:
+        # A failed call may still have committed
+        progress_reader.invalidate(user_id)
+    leaderboard.record(user_id, progress)
+    publish_mutations(user_id, mutations, progress)
+    return progress
+
+async def unlock_achievements(user_id: str, achievement_ids: List[str]) -> List[str]:
+    """Atomically add achievements, returning only those this call unlocked"""
+    newly_unlocked = await store.unlock_achievements(user_id, achievement_ids)
+    progress_reader.invalidate(user_id)
+    if newly_unlocked:
+        progress_broker.publish(user_id, "achievements", {"unlocked": newly_unlocked})
+    return newly_unlocked
+
+# === STUDY EVENTS ===
+def mutation_events(user_id: str, mutations: List[Mutation]) -> List[dict]:
+    """One study event per mutation, sharing a timestamp and ordered by seq"""
+    ts = datetime.now(timezone.utc).isoformat()
+    day = date.today().isoformat()
+    return [
+        StudyEvent(
+            user_id=user_id, type=m.kind, ts=ts, seq=seq, day=day,
+            unit_id=m.unit_id, duration_minutes=m.duration_minutes, key=m.key
+        ).model_dump(exclude_none=True)
+        for seq, m in enumerate(mutations)
+    ]
+
+async def replay_snapshots(user_id: Optional[str] = None, batch_size: int = 500) -> int:
+    """Rebuild snapshots from the event log, one user or all of them
+
+    Events are streamed in (user, ts, seq) order, so only one user's
+    history is held in memory; snapshots are written in bulk batches.
+    Returns the number of users rebuilt.
+    """
+    snapshots: List[dict] = []
+    rebuilt = 0
     
-    # Verify unit exists
-    unit_found = False
-    unit_xp = 100
-    for subject_data in SUBJECTS_DATA.values():
-        for unit in subject_data["units"]:
-            if unit["id"] == unit_id:
-                unit_found = True
-                unit_xp = unit.get("xp", 100)
-                break
-        if unit_found:
-            break
+    async def flush() -> int:
+        errors = await store.write_snapshots(snapshots)
+        for index, error in errors.items():
+            logger.error("Could not rebuild progress for %s: %s", snapshots[index]["user_id"], error)
+        return len(snapshots) - len(errors)
     
-    if not unit_found:
-        raise HTTPException(status_code=404, detail="Unit not found")
+    current_user, events = None, []
+    async for event in store.iter_events(user_id):
+        if event["user_id"] != current_user:
+            if current_user is not None:
+                snapshots.append(replay_events(current_user, events))
+            current_user, events = event["user_id"], []
+            if len(snapshots) >= batch_size:
+                rebuilt += await flush()
+                snapshots = []
+        events.append(event)
+    if current_user is not None:
+        snapshots.append(replay_events(current_user, events))
+    if snapshots:
+        rebuilt += await flush()
+    progress_reader.clear()
+    leaderboard.clear()
+    return rebuilt
+
+# Progress fields a baseline event carries (see apply_event)
+BASELINE_FIELDS = (
+    "completed_units", "xp", "streak_days", "last_study_date",
+    "pomodoro_sessions", "unlocked_achievements"
+)
+
+async def seed_baseline_events() -> int:
+    """Record a baseline event for every snapshot that has no events yet
+
+    Run once when rolling out the event log, so progress made before it
+    existed survives a replay.
+    """
+    seeded = 0
+    async for progress in store.iter_progress():
+        if await store.has_events(progress["user_id"]):
+            continue
+        event = StudyEvent(
+            user_id=progress["user_id"],
+            type="baseline",
+            ts=progress.get("created_at") or datetime.now(timezone.utc).isoformat(),
+            day=progress.get("last_study_date") or date.today().isoformat(),
+            snapshot={k: progress.get(k) for k in BASELINE_FIELDS}
+        )
+        await store.append_events([event.model_dump(exclude_none=True)])
+        seeded += 1
+    return seeded
+
+def check_and_unlock_achievements(
+    progress: dict,
+    changed_fields: Optional[Iterable[str]] = None,
+    new_units: Iterable[str] = ()
+) -> List[str]:
+    """Check if any new achievements should be unlocked
+
+    Only rules watching `changed_fields` are evaluated (every rule when
+    None). When `new_units` is given, unit rules are narrowed to those
+    units as well.
+    """
+    cur = curriculum
+    new_units = frozenset(new_units)
+    fields = cur.rules_by_field.keys() if changed_fields is None else changed_fields
+    candidates = []
+    for field in fields:
+        if field == "completed_units" and new_units:
+            for unit_id in new_units:
+                candidates.extend(cur.unit_rules.get(unit_id, ()))
+            candidates.extend(cur.aggregate_unit_rules)
+        else:
+            candidates.extend(cur.rules_by_field.get(field, ()))
+    if not candidates:
+        return []
     
-    progress = await get_or_create_progress()
-    completed_units = progress.get("completed_units", [])
-    current_xp = progress.get("xp", 0)
+    with timed_span("rules"):
+        unlocked = set(progress.get("unlocked_achievements", []))
+        state = RuleState(
+            completed_units=frozenset(progress.get("completed_units", [])),
+            streak_days=progress.get("streak_days", 0),
+            pomodoro_sessions=progress.get("pomodoro_sessions", 0),
+            new_units=new_units
+        )
+        newly_unlocked = []
+        for rule in candidates:
+            if rule.achievement_id not in unlocked and rule.is_met(state):
+                unlocked.add(rule.achievement_id)
+                newly_unlocked.append(rule.achievement_id)
+    return newly_unlocked
+
+def subject_progress(subject_key: str, completed_units: set) -> dict:
+    """The per-user fields of a subject summary"""
+    units = curriculum.subjects[subject_key].units
+    subject_completed = len(curriculum.subject_unit_ids[subject_key] & completed_units)
+    return {
+        "completed_units": subject_completed,
+        "total_units": len(units),
+        "progress_percentage": round((subject_completed / len(units)) * 100, 1) if units else 0
+    }
+
+def build_subject_summary(subject_key: str, completed_units: set, **extra) -> RawJSON:
+    """One subject's catalog entry and progress for the given completed unit ids"""
+    return splice(curriculum.subject_prefixes[subject_key], {**subject_progress(subject_key, completed_units), **extra})
+
+def build_subject_summaries(completed_units: set) -> RawJSON:
+    """Per-subject progress for the given set of completed unit ids"""
+    return encode_array(build_subject_summary(subject_key, completed_units) for subject_key in curriculum.subjects)
+
+# === STUDY ANALYTICS ===
+# Charts computed from the event log with pandas. numpy and pandas are
+# imported on first use to keep them off the cold-start path.
+@functools.lru_cache(maxsize=None)
+def analytics_libs():
+    started = time.perf_counter()
+    import numpy
+    import pandas
+    startup_report.record_deferred("analytics_libs", time.perf_counter() - started)
+    return numpy, pandas
+
+def analytics_rows(events: Iterable[dict]) -> Iterable[dict]:
+    """Event rows for analytics; a baseline becomes a reset followed by
+    one carried-over completion per unit in its snapshot"""
+    for event in events:
+        if event["type"] == "baseline":
+            yield {"type": "reset", "day": event["day"]}
+            for unit_id in event["snapshot"].get("completed_units") or ():
+                yield {"type": "toggle", "day": event["day"], "unit_id": unit_id, "carried": True}
+        else:
+            yield event
+
+def compute_analytics(events: List[dict], today: date, cur: Curriculum) -> dict:
+    """Activity heatmap, XP history and per-subject velocity for one user's events
+
+    Mirrors the replay fold: resent idempotency keys count once, a reset
+    clears progress, and the nth toggle of a unit completes it when n is
+    odd. Days are study days as recorded with each event.
+    """
+    np, pd = analytics_libs()
+    frame = pd.DataFrame.from_records(
+        list(analytics_rows(events)),
+        columns=["type", "day", "unit_id", "duration_minutes", "key", "carried"]
+    )
+    frame = frame[frame["key"].isna() | ~frame["key"].duplicated()]
+    frame["day"] = pd.to_datetime(frame["day"])
+    frame["segment"] = (frame["type"] == "reset").cumsum()
+    current = frame["segment"].max() if len(frame) else 0
     
-    # Toggle completion
-    if unit_id in completed_units:
-        completed_units.remove(unit_id)
-        current_xp = max(0, current_xp - unit_xp)
-        completed = False
-    else:
-        completed_units.append(unit_id)
-        current_xp += unit_xp
-        completed = True
+    toggles = frame[(frame["type"] == "toggle") & frame["unit_id"].isin(cur.unit_index.keys())].copy()
+    toggles["sign"] = np.where(toggles.groupby(["segment", "unit_id"]).cumcount() % 2 == 0, 1, -1)
+    toggles["xp"] = (toggles["sign"] * toggles["unit_id"].map(cur.unit_xp)).astype("int64")
+    toggles["subject"] = toggles["unit_id"].map(cur.unit_subjects)
     
-    # Update streak
-    today = date.today().isoformat()
-    last_study = progress.get("last_study_date")
-    streak = progress.get("streak_days", 0)
+    # Activity per day; units carried over by a baseline were not studied then
+    studied = toggles[(toggles["sign"] > 0) & toggles["carried"].isna()]
+    pomodoros = frame[frame["type"] == "pomodoro"]
+    activity = pd.DataFrame({
+        "units": studied.groupby("day").size(),
+        "pomodoros": pomodoros.groupby("day").size(),
+        "minutes": pomodoros.groupby("day")["duration_minutes"].sum()
+    }).fillna(0).astype(int).sort_index()
     
-    if completed:
-        if last_study:
-            last_date = date.fromisoformat(last_study)
-            today_date = date.today()
-            diff = (today_date - last_date).days
-            if diff == 1:
-                streak += 1
-            elif diff > 1:
-                streak = 1
-            # Same day - no change to streak
-        else:
-            streak = 1
+    # XP at the end of each day, carried forward through idle days
+    running = pd.concat([
+        toggles.groupby("segment")["xp"].cumsum(),
+        pd.Series(0, index=frame.index[frame["type"] == "reset"])
+    ]).sort_index()
+    daily_xp = running.groupby(frame.loc[running.index, "day"].values).last()
+    if len(daily_xp):
+        days = pd.date_range(daily_xp.index.min(), max(daily_xp.index.max(), pd.Timestamp(today)))
+        daily_xp = daily_xp.reindex(days).ffill().astype(int)
     
-    # Check achievements
-    temp_progress = {
-        "completed_units": completed_units,
-        "streak_days": streak,
-        "pomodoro_sessions": progress.get("pomodoro_sessions", 0),
-        "unlocked_achievements": progress.get("unlocked_achievements", [])
+    # Net completions over the trailing window of the current segment,
+    # or since it began when that is more recent
+    latest = toggles[toggles["segment"] == current]
+    segment_days = frame.loc[frame["segment"] == current, "day"]
+    window_start = pd.Timestamp(today) - pd.Timedelta(days=VELOCITY_WINDOW_DAYS - 1)
+    if len(segment_days):
+        window_start = max(window_start, segment_days.min())
+    window_days = max((pd.Timestamp(today) - window_start).days + 1, 1)
+    subjects = pd.DataFrame({
+        "completed": latest.groupby("subject")["sign"].sum(),
+        "recent": latest[latest["day"] >= window_start].groupby("subject")["sign"].sum(),
+        "total": pd.Series({key: len(units) for key, units in cur.subject_unit_ids.items()})
+    }).reindex(list(cur.subjects)).fillna(0)
+    subjects["per_week"] = subjects["recent"].clip(lower=0) * 7 / window_days
+    remaining = subjects["total"] - subjects["completed"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.ceil(remaining * 7 / subjects["per_week"])
+    # No projection for finished subjects or ones with no recent progress
+    finish = pd.Timestamp(today) + pd.to_timedelta(
+        days_left.where((subjects["per_week"] > 0) & (remaining > 0)), unit="D"
+    )
+    
+    return {
+        "heatmap": [
+            {"day": day, "units": units, "pomodoros": count, "minutes": minutes}
+            for day, units, count, minutes in zip(
+                activity.index.strftime("%Y-%m-%d").tolist(), activity["units"].tolist(),
+                activity["pomodoros"].tolist(), activity["minutes"].tolist()
+            )
+        ],
+        "xp": [
+            {"day": day, "xp": xp}
+            for day, xp in zip(daily_xp.index.strftime("%Y-%m-%d").tolist(), daily_xp.tolist())
+        ],
+        "subjects": [
+            {
+                "subject": key,
+                "name": cur.subjects[key].name,
+                "completed_units": int(row.completed),
+                "total_units": int(row.total),
+                "units_per_week": round(float(row.per_week), 2),
+                "projected_finish": None if pd.isna(row.finish) else row.finish.strftime("%Y-%m-%d")
+            }
+            for key, row in subjects.assign(finish=finish).iterrows()
+        ]
     }
-    new_achievements = await check_and_unlock_achievements(temp_progress)
-    unlocked_achievements = list(set(progress.get("unlocked_achievements", []) + new_achievements))
+
+# Keyed by (user, day); entries hold the progress and curriculum versions
+# they were computed at
+analytics_cache: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], dict]]" = OrderedDict()
+
+async def get_analytics(user_id: str, version: int) -> dict:
+    """A user's analytics, recomputed once per day or after they study"""
+    cur = curriculum
+    key = (user_id, date.today().isoformat())
+    cached = analytics_cache.get(key)
+    if cached is not None and cached[0] == (version, cur.version):
+        analytics_cache.move_to_end(key)
+        return cached[1]
+    with db_timer("find", "study_events"):
+        events = [event async for event in store.iter_events(user_id)]
+    # Off the event loop, so years of history do not stall other requests
+    analytics = await asyncio.to_thread(compute_analytics, events, date.fromisoformat(key[1]), cur)
+    analytics_cache[key] = ((version, cur.version), analytics)
+    analytics_cache.move_to_end(key)
+    while len(analytics_cache) > ANALYTICS_CACHE_SIZE:
+        analytics_cache.popitem(last=False)
+    return analytics
+
+async def analytics_response(request: Request, user_id: str, chart: str, select: Callable[[list], list]) -> Response:
+    progress = await get_or_create_progress(user_id, ("version",))
+    analytics = await get_analytics(user_id, progress["version"])
+    route = f"analytics/{chart}@{date.today().isoformat()}"
+    return cached_json_response(request, user_id, route, progress, lambda p: select(analytics[chart.partition("?")[0]]))
+
+# === BULK TRANSFER ===
+# NDJSON export and import of progress snapshots, one document per line.
+# Both stream, so memory stays bounded by a chunk or batch however many
+# users there are.
+async def export_progress_ndjson() -> AsyncIterator[bytes]:
+    """Every progress snapshot as NDJSON, in chunks of about EXPORT_CHUNK_BYTES"""
+    chunk: List[bytes] = []
+    size = 0
+    async for progress in store.iter_progress():
+        line = json_bytes(progress) + b"\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """(line number, line) for each non-blank line of a streamed NDJSON body
+
+    A line longer than IMPORT_MAX_LINE_BYTES is yielded as None, and the
+    rest of it is skipped rather than buffered.
+    """
+    buffer = b""
+    number = 0
+    skipping = False
+    async for chunk in chunks:
+        if skipping:
+            end = chunk.find(b"\n")
+            if end < 0:
+                continue
+            skipping = False
+            chunk = chunk[end + 1:]
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if len(line) > IMPORT_MAX_LINE_BYTES:
+                yield number, None
+            elif line.strip():
+                yield number, line
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            number += 1
+            yield number, None
+            buffer = b""
+            skipping = True
+    if buffer.strip():
+        yield number + 1, buffer
+
+def import_snapshot(document: dict) -> dict:
+    """Validate one imported progress document into a snapshot to write
+
+    Completed units must exist in the curriculum. The snapshot is replayed
+    from a baseline event, exactly as a later replay of the event log
+    would rebuild it; xp is recomputed from the completed units, as are
+    level and subject_xp, and achievements they earn are unlocked.
+    Missing fields take their defaults, except `id` and `created_at`,
+    which an existing document keeps; `version` is always bumped rather
+    than imported.
+    """
+    progress = UserProgress.model_validate(document)
+    if not USER_ID_PATTERN.match(progress.user_id):
+        raise ValueError("Invalid user id")
+    completed_units = list(dict.fromkeys(progress.completed_units))
+    unknown = [unit_id for unit_id in completed_units if unit_id not in curriculum.unit_index]
+    if unknown:
+        raise ValueError(f"Unknown unit ids: {', '.join(unknown)}")
+    baseline = progress.model_dump(include=set(BASELINE_FIELDS))
+    baseline.update(
+        completed_units=completed_units,
+        xp=sum(curriculum.unit_xp[unit_id] for unit_id in completed_units)
+    )
+    snapshot = replay_events(progress.user_id, [{"type": "baseline", "snapshot": baseline}])
+    snapshot.update(progress.model_dump(include={"id", "created_at"} & progress.model_fields_set))
+    return snapshot
+
+def describe_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'document'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+async def import_progress_ndjson(chunks: AsyncIterator[bytes]) -> dict:
+    """Write streamed NDJSON progress documents in unordered bulk batches
+
+    Each written snapshot is also logged as a baseline event, so a later
+    replay reproduces it. Records that are too long or fail to parse,
+    validate or write are reported by line number (the first
+    IMPORT_MAX_ERRORS of them) and do not stop the import.
+    """
+    imported = failed = 0
+    errors: List[dict] = []
+    batch: List[Tuple[int, dict]] = []
     
-    # Update database
-    await db.user_progress.update_one(
-        {},
-        {"$set": {
-            "completed_units": completed_units,
-            "xp": current_xp,
-            "level": calculate_level(current_xp),
-            "streak_days": streak,
-            "last_study_date": today if completed else last_study,
-            "unlocked_achievements": unlocked_achievements,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }},
-        upsert=True
+    def fail(line_number: int, user_id: Optional[str], error: str) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": line_number, "user_id": user_id, "error": error})
+    
+    async def flush() -> None:
+        nonlocal imported
+        snapshots = [snapshot for _, snapshot in batch]
+        write_errors = await store.write_snapshots(snapshots)
+        written = []
+        for index, (line_number, snapshot) in enumerate(batch):
+            if index in write_errors:
+                fail(line_number, snapshot["user_id"], write_errors[index])
+            else:
+                written.append(snapshot)
+        if written:
+            await store.append_events([
+                StudyEvent(
+                    user_id=snapshot["user_id"], type="baseline",
+                    snapshot={k: snapshot[k] for k in BASELINE_FIELDS}
+                ).model_dump(exclude_none=True)
+                for snapshot in written
+            ])
+        for snapshot in written:
+            progress_reader.invalidate(snapshot["user_id"])
+            leaderboard.record(snapshot["user_id"], snapshot)
+            progress_broker.publish(snapshot["user_id"], *ProgressBroker.RESYNC)
+        imported += len(written)
+        batch.clear()
+    
+    async for line_number, line in ndjson_lines(chunks):
+        if line is None:
+            fail(line_number, None, f"Line is longer than {IMPORT_MAX_LINE_BYTES} bytes")
+            continue
+        document = None
+        try:
+            document = json.loads(line)
+            snapshot = import_snapshot(document)
+        except (ValueError, ValidationError) as e:
+            user_id = document.get("user_id") if isinstance(document, dict) else None
+            fail(line_number, user_id if isinstance(user_id, str) else None, describe_error(e))
+            continue
+        # Unordered writes within a batch, so a repeated user starts a new one
+        if any(queued["user_id"] == snapshot["user_id"] for _, queued in batch):
+            await flush()
+        batch.append((line_number, snapshot))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+# === CURRICULUM RELOAD ===
+class CurriculumReloader:
+    """Swaps in new curriculum versions from the configured source
+
+    Checks run from a route dependency at most every `interval` seconds,
+    so they also happen on serverless instances with no background tasks.
+    A check only stats the file, or reads the newest version number from
+    Mongo; the document is parsed, validated and built only when that
+    changed. A document that fails validation is logged and the running
+    version kept.
+    """
+
+    def __init__(self, source: str, path: str, interval: float):
+        if source not in ("file", "mongo"):
+            raise ValueError(f"Unknown CURRICULUM_SOURCE: {source}")
+        if source == "mongo" and not isinstance(store, MongoProgressStore):
+            raise ValueError("CURRICULUM_SOURCE=mongo needs STORAGE_BACKEND=mongo")
+        self.source = source
+        self.path = path
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        if source == "file":
+            # Loaded at import, so the first check is one interval away
+            self._file_stamp = self.file_stamp()
+            self._next_check = time.monotonic() + interval if interval > 0 else float("inf")
+        else:
+            self._next_check = 0.0
+
+    def file_stamp(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    async def check(self) -> None:
+        if time.monotonic() < self._next_check:
+            return
+        if self._lock.locked() and self._next_check > 0:
+            # Another request is checking; keep serving the running version
+            return
+        async with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.interval if self.interval > 0 else float("inf")
+            try:
+                document = await self.fetch()
+            except Exception:
+                logger.exception("Curriculum check failed; keeping version %s", curriculum.version)
+                return
+            if document is not None and document.version != curriculum.version:
+                install_curriculum(Curriculum(document), sync_store=self.source == "file")
+
+    async def fetch(self) -> Optional[CurriculumDocument]:
+        """The source's document, or None when it cannot have changed"""
+        if self.source == "mongo":
+            with db_timer("find_one", "curriculum"):
+                newest = await store.db.curriculum.find_one({}, {"_id": 0, "version": 1}, sort=[("version", -1)])
+            if newest is None or newest["version"] == curriculum.version:
+                return None
+            with db_timer("find_one", "curriculum"):
+                document = await store.db.curriculum.find_one({"version": newest["version"]}, {"_id": 0})
+            return CurriculumDocument.model_validate(document)
+        stamp = self.file_stamp()
+        if stamp == self._file_stamp:
+            return None
+        self._file_stamp = stamp
+        return parse_curriculum(Path(self.path).read_text(encoding="utf-8"), self.path)
+
+def install_curriculum(new: Curriculum, sync_store: bool = False) -> None:
+    """Make `new` the running curriculum
+
+    Rendered responses and analytics are keyed by curriculum version, so
+    they need no clearing. With `sync_store`, the sync_curriculum job
+    brings stored progress in line in the background, so the request
+    that noticed the change only waits for the swap; a version published
+    to Mongo was already synced by `python server.py curriculum FILE --publish`.
+    """
+    global curriculum
+    old, curriculum = curriculum, new
+    leaderboard.clear()
+    logger.info("Curriculum version %s installed (was %s): %d subjects, %d units",
+                new.version, old.version, len(new.subjects), new.total_units)
+    removed = old.all_unit_ids - new.all_unit_ids
+    if removed:
+        logger.warning("Curriculum version %s removes units %s; progress on them keeps its XP but no longer counts",
+                       new.version, ", ".join(sorted(removed)))
+    if sync_store and not COLD_START_MODE:
+        scheduler.trigger("sync_curriculum")
+
+curriculum_reloader = CurriculumReloader(CURRICULUM_SOURCE, CURRICULUM_PATH, CURRICULUM_CHECK_SECONDS)
+
+async def curriculum_current() -> None:
+    """Route dependency that swaps in a newer curriculum when one was published"""
+    await curriculum_reloader.check()
+
+# === BACKGROUND JOBS ===
+class Job:
+    """A maintenance coroutine run every `interval` seconds, or only when triggered when None"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[object]], interval: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_started: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.last_result: object = None
+        self.last_error: Optional[str] = None
+        self.next_run: Optional[float] = None
+        self._wake = asyncio.Event()
+
+    def trigger(self) -> None:
+        """Run as soon as possible; triggers during a run queue one more"""
+        self._wake.set()
+
+    async def run(self) -> None:
+        self.running = True
+        self.last_started = datetime.now(timezone.utc).isoformat()
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            self.last_result = await self.func()
+            self.last_error = None
+        except Exception as e:
+            outcome = "error"
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.exception("Background job %s failed", self.name)
+        finally:
+            self.running = False
+            self.runs += 1
+            self.last_duration = time.perf_counter() - started
+            metrics.observe_job(self.name, outcome, self.last_duration)
+
+    async def loop(self) -> None:
+        while True:
+            self.next_run = time.monotonic() + self.interval if self.interval else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.run()
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started_at": self.last_started,
+            "last_duration_seconds": round(self.last_duration, 6) if self.last_duration is not None else None,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "next_run_in_seconds": round(max(self.next_run - time.monotonic(), 0.0), 3) if self.next_run else None
+        }
+
+class Scheduler:
+    """Runs jobs as asyncio tasks alongside the app, off the request path
+
+    Periodic jobs run once at start and then every interval. Each job
+    runs one at a time, and jobs yield to the event loop between chunks
+    of users, so live requests are never queued behind a whole pass.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._one_off: Set[asyncio.Task] = set()
+
+    def add(self, name: str, func: Callable[[], Awaitable[object]], interval: Optional[float] = None) -> Job:
+        job = self.jobs[name] = Job(name, func, interval)
+        return job
+
+    def start(self) -> None:
+        for job in self.jobs.values():
+            if job.interval:
+                job.trigger()
+            self._tasks.append(asyncio.create_task(job.loop(), name=f"job:{job.name}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def trigger(self, name: str) -> None:
+        job = self.jobs[name]
+        if self._tasks:
+            job.trigger()
+        elif not job.running:
+            # Not started (SCHEDULER_ENABLED=0): still run it off the request path
+            task = asyncio.create_task(job.run(), name=f"job:{name}")
+            self._one_off.add(task)
+            task.add_done_callback(self._one_off.discard)
+
+    def status(self) -> List[dict]:
+        return [job.status() for job in self.jobs.values()]
+
+async def expire_streaks() -> int:
+    """Zero the streaks of users who missed a whole day, returning how many
+
+    Read endpoints show stored streaks as they are, so this is what keeps
+    a lapsed streak off the dashboard and the leaderboard.
+    """
+    cutoff = previous_day(date.today().isoformat())
+    expired = 0
+    while True:
+        user_ids = await store.expire_streaks(cutoff, JOB_CHUNK_SIZE)
+        for user_id in user_ids:
+            progress_reader.invalidate(user_id)
+            progress_broker.publish(user_id, *ProgressBroker.RESYNC)
+        expired += len(user_ids)
+        if len(user_ids) < JOB_CHUNK_SIZE:
+            break
+        await asyncio.sleep(0)
+    if expired:
+        # Streaks break leaderboard ties
+        leaderboard.clear()
+        logger.info("Expired %d lapsed streaks", expired)
+    return expired
+
+async def recompute_achievements() -> int:
+    """Unlock every achievement stored progress now qualifies for, returning how many
+
+    Writes only evaluate the rules they touch, so achievements added or
+    changed by a new curriculum version are caught up here instead.
+    """
+    unlocked = checked = 0
+    async for progress in store.iter_progress():
+        earned = check_and_unlock_achievements(progress)
+        if earned:
+            unlocked += len(await unlock_achievements(progress["user_id"], earned))
+        checked += 1
+        if checked % JOB_CHUNK_SIZE == 0:
+            await asyncio.sleep(0)
+    if unlocked:
+        logger.info("Unlocked %d achievements for curriculum version %s", unlocked, curriculum.version)
+    return unlocked
+
+async def sync_store_curriculum() -> int:
+    """Bring stored progress in line with a hot-swapped curriculum, returning its version"""
+    cur = curriculum
+    await store.sync_curriculum(cur)
+    # Cached progress and ranked scopes predate the re-derived subject_xp
+    progress_reader.clear()
+    leaderboard.clear()
+    scheduler.trigger("recompute_achievements")
+    return cur.version
+
+scheduler = Scheduler()
+scheduler.add("expire_streaks", expire_streaks, STREAK_EXPIRY_SECONDS)
+scheduler.add("sync_curriculum", sync_store_curriculum)
+scheduler.add("recompute_achievements", recompute_achievements)
+
+# === API ROUTES ===
+@api_router.get("/")
+async def root():
+    return {"message": "Study Tracker API"}
+
+def build_subjects(progress: dict) -> RawJSON:
+    return build_subject_summaries(set(progress.get("completed_units", [])))
+
+class DashboardField(NamedTuple):
+    sources: Tuple[str, ...]
+    build: Callable[[dict], object]
+
+def total_completed(progress: dict) -> int:
+    # Units removed from the curriculum no longer count
+    return len(curriculum.all_unit_ids.intersection(progress.get("completed_units", [])))
+
+def overall_progress(progress: dict) -> float:
+    total_units = curriculum.total_units
+    return round((total_completed(progress) / total_units) * 100, 1) if total_units else 0
+
+# Each dashboard field with the progress fields it reads, so a `fields=`
+# selection computes only what it returns
+DASHBOARD_BUILDERS: Mapping[str, DashboardField] = MappingProxyType({
+    "xp": DashboardField(("xp",), lambda p: p.get("xp", 0)),
+    "level": DashboardField(("xp",), lambda p: calculate_level(p.get("xp", 0))),
+    "xp_to_next_level": DashboardField(("xp",), lambda p: xp_to_next_level(p.get("xp", 0))),
+    "streak_days": DashboardField(("streak_days",), lambda p: p.get("streak_days", 0)),
+    "total_completed": DashboardField(("completed_units",), total_completed),
+    "total_units": DashboardField((), lambda p: curriculum.total_units),
+    "overall_progress": DashboardField(("completed_units",), overall_progress),
+    "subjects": DashboardField(("completed_units",), build_subjects),
+    "unlocked_achievements": DashboardField(("unlocked_achievements",), lambda p: p.get("unlocked_achievements", [])),
+    "pomodoro_sessions": DashboardField(("pomodoro_sessions",), lambda p: p.get("pomodoro_sessions", 0)),
+})
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma-separated `fields=` selector, in canonical order
+
+    Returns None (everything) when no selector is given.
+    """
+    if fields is None:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    if not requested:
+        raise HTTPException(status_code=400, detail="No fields selected")
+    return tuple(f for f in allowed if f in requested)
+
+def dashboard_sources(fields: Optional[Tuple[str, ...]]) -> Tuple[str, ...]:
+    """Progress fields read by the selected dashboard fields"""
+    if fields is None:
+        return DASHBOARD_FIELDS
+    return tuple({s: None for f in fields for s in DASHBOARD_BUILDERS[f].sources}) + ("version",)
+
+def build_dashboard(progress: dict, fields: Optional[Tuple[str, ...]] = None) -> RawJSON:
+    return encode_object((name, DASHBOARD_BUILDERS[name].build(progress)) for name in fields or DASHBOARD_BUILDERS)
+
+def build_achievements(progress: dict, fields: Optional[Tuple[str, ...]] = None) -> RawJSON:
+    unlocked = set(progress.get("unlocked_achievements", []))
+    with_unlocked = fields is None or "unlocked" in fields
+    return encode_array(
+        splice(prefix, {"unlocked": achievement_id in unlocked} if with_unlocked else {})
+        for achievement_id, prefix in curriculum.achievement_prefixes(fields)
     )
+
+def build_subject_page(subject_key: str, progress: dict) -> RawJSON:
+    completed_units = set(progress.get("completed_units", []))
+    return build_subject_summary(
+        subject_key, completed_units,
+        completed_unit_ids=sorted(curriculum.subject_unit_ids[subject_key] & completed_units)
+    )
+
+@api_router.get("/catalog")
+async def get_catalog(request: Request):
+    """Static subjects, units and achievements, cacheable by browsers and CDNs"""
+    cur = curriculum
+    # The URL is the same across curriculum versions, so caches revalidate
+    # every use; a 304 for the current ETag is cheap
+    headers = {
+        "ETag": cur.catalog_etag,
+        "Cache-Control": "public, no-cache",
+        "Vary": "Accept-Encoding"
+    }
+    matched = matching_etag(request.headers.get("if-none-match"), cur.catalog_etag)
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    return send_json(request, ("catalog", cur.catalog_etag), lambda: cur.catalog_json, headers)
+
+@api_router.get("/subjects")
+async def get_subjects(request: Request, user_id: str = Depends(get_user_id)):
+    """Get all subjects with their units"""
+    progress = await get_or_create_progress(user_id, SUBJECTS_FIELDS)
+    return cached_json_response(request, user_id, "subjects", progress, build_subjects)
+
+@api_router.get("/subjects/{name}")
+async def get_subject(name: str, request: Request, user_id: str = Depends(get_user_id)):
+    """Get one subject with its units and the user's completed unit ids"""
+    subject_key = curriculum.subject_keys_by_name.get(name.lower())
+    if subject_key is None:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    progress = await get_or_create_progress(user_id, SUBJECTS_FIELDS)
+    if subject_key not in curriculum.subjects:
+        # Removed by a curriculum swap while the progress was read
+        raise HTTPException(status_code=404, detail="Subject not found")
+    return cached_json_response(
+        request, user_id, f"subject:{subject_key}", progress,
+        lambda p: build_subject_page(subject_key, p)
+    )
+
+@api_router.get("/dashboard")
+async def get_dashboard(request: Request, fields: Optional[str] = None, user_id: str = Depends(get_user_id)):
+    """Get dashboard data with overall progress, optionally only `fields`"""
+    selected = parse_fields(fields, DASHBOARD_BUILDERS)
+    progress = await get_or_create_progress(user_id, dashboard_sources(selected))
+    route = "dashboard" if selected is None else f"dashboard?fields={','.join(selected)}"
+    return cached_json_response(request, user_id, route, progress, lambda p: build_dashboard(p, selected))
+
+@api_router.post("/units/toggle")
+async def toggle_unit_completion(request: ToggleUnitRequest, user_id: str = Depends(get_user_id)):
+    """Toggle a unit's completion status"""
+    unit_id = request.unit_id
+    
+    # Verify unit exists
+    unit = curriculum.unit_index.get(unit_id)
+    if unit is None:
+        raise HTTPException(status_code=404, detail="Unit not found")
+    
+    # Toggle, XP and streak are applied in a single atomic update so that
+    # concurrent toggles cannot overwrite each other
+    progress = await apply_mutations(user_id, [Mutation("toggle", unit_id)])
+    completed = unit_id in progress["completed_units"]
+    current_xp = progress["xp"]
+    streak = progress["streak_days"]
+    
+    # Check achievements against the post-update state; un-completing a
+    # unit cannot unlock anything
+    new_achievements = check_and_unlock_achievements(
+        progress, ["completed_units", "streak_days"], [unit_id]
+    ) if completed else []
+    if new_achievements:
+        new_achievements = await unlock_achievements(user_id, new_achievements)
     
     return {
         "unit_id": unit_id,
@@ -394,90 +3009,230 @@ async def toggle_unit_completion(request: ToggleUnitRequest):
     }
 
 @api_router.post("/pomodoro/complete")
-async def complete_pomodoro(request: PomodoroSessionRequest):
+async def complete_pomodoro(request: PomodoroSessionRequest, user_id: str = Depends(get_user_id)):
     """Record a completed pomodoro session"""
     if not request.completed:
         return {"message": "Session not completed"}
     
-    progress = await get_or_create_progress()
-    sessions = progress.get("pomodoro_sessions", 0) + 1
-    
-    # Update streak
-    today = date.today().isoformat()
-    last_study = progress.get("last_study_date")
-    streak = progress.get("streak_days", 0)
+    progress = await apply_mutations(
+        user_id, [Mutation("pomodoro", duration_minutes=request.duration_minutes)]
+    )
+    sessions = progress["pomodoro_sessions"]
+    streak = progress["streak_days"]
     
-    if last_study:
-        last_date = date.fromisoformat(last_study)
-        today_date = date.today()
-        diff = (today_date - last_date).days
-        if diff == 1:
-            streak += 1
-        elif diff > 1:
-            streak = 1
-    else:
-        streak = 1
+    new_achievements = check_and_unlock_achievements(progress, ["pomodoro_sessions", "streak_days"])
+    if new_achievements:
+        new_achievements = await unlock_achievements(user_id, new_achievements)
     
-    # Check achievements
-    temp_progress = {
-        "completed_units": progress.get("completed_units", []),
-        "streak_days": streak,
+    return {
         "pomodoro_sessions": sessions,
-        "unlocked_achievements": progress.get("unlocked_achievements", [])
+        "streak_days": streak,
+        "new_achievements": new_achievements
     }
-    new_achievements = await check_and_unlock_achievements(temp_progress)
-    unlocked_achievements = list(set(progress.get("unlocked_achievements", []) + new_achievements))
+
+@api_router.post("/batch")
+async def apply_batch(request: BatchRequest, user_id: str = Depends(get_user_id)):
+    """Apply queued toggle and pomodoro operations in one write
+
+    Each operation carries an idempotency key, so a client can safely
+    resend a batch after a dropped response without double-counting XP.
+    """
+    mutations = []
+    seen_keys = set()
+    for op in request.operations:
+        if op.op == "toggle" and op.unit_id not in curriculum.unit_index:
+            raise HTTPException(status_code=404, detail=f"Unit not found: {op.unit_id}")
+        if op.idempotency_key in seen_keys or (op.op == "pomodoro" and not op.completed):
+            continue
+        seen_keys.add(op.idempotency_key)
+        mutations.append(Mutation(op.op, op.unit_id, op.idempotency_key, op.duration_minutes))
     
-    await db.user_progress.update_one(
-        {},
-        {"$set": {
-            "pomodoro_sessions": sessions,
-            "streak_days": streak,
-            "last_study_date": today,
-            "unlocked_achievements": unlocked_achievements,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }},
-        upsert=True
-    )
+    # Keys this write applied are tagged with its id; a resent key keeps the
+    # id of the write that first applied it
+    write_id = uuid.uuid4().hex
+    progress = await apply_mutations(user_id, mutations, BATCH_FIELDS, write_id)
+    applied_keys = {
+        entry["key"] for entry in progress.get("applied_ops", [])
+        if entry["key"] in seen_keys and entry.get("write_id") == write_id
+    }
+    completed_units = set(progress["completed_units"])
+    
+    results = []
+    reported_keys = set()
+    for op in request.operations:
+        result = {"idempotency_key": op.idempotency_key, "op": op.op}
+        if op.op == "pomodoro" and not op.completed:
+            result["status"] = "skipped"
+        elif op.idempotency_key in applied_keys and op.idempotency_key not in reported_keys:
+            result["status"] = "applied"
+        else:
+            result["status"] = "duplicate"
+        reported_keys.add(op.idempotency_key)
+        if op.op == "toggle":
+            result["unit_id"] = op.unit_id
+            result["completed"] = op.unit_id in completed_units
+        results.append(result)
     
+    # Evaluate achievements once, over the final state
+    applied = [m for m in mutations if m.key in applied_keys]
+    changed_fields = set()
+    if any(m.kind == "pomodoro" for m in applied):
+        changed_fields.update(("pomodoro_sessions", "streak_days"))
+    new_units = {m.unit_id for m in applied if m.kind == "toggle" and m.unit_id in completed_units}
+    if new_units:
+        changed_fields.update(("completed_units", "streak_days"))
+    new_achievements = check_and_unlock_achievements(progress, changed_fields, new_units) if changed_fields else []
+    if new_achievements:
+        new_achievements = await unlock_achievements(user_id, new_achievements)
+    
+    xp = progress["xp"]
     return {
-        "pomodoro_sessions": sessions,
-        "streak_days": streak,
+        "results": results,
+        "completed_units": progress["completed_units"],
+        "xp": xp,
+        "level": calculate_level(xp),
+        "streak_days": progress["streak_days"],
+        "pomodoro_sessions": progress["pomodoro_sessions"],
         "new_achievements": new_achievements
     }
 
 @api_router.get("/achievements")
-async def get_achievements():
-    """Get all achievements with unlock status"""
-    progress = await get_or_create_progress()
-    unlocked = set(progress.get("unlocked_achievements", []))
-    
-    achievements = []
-    for ach in ACHIEVEMENTS_DATA:
-        achievements.append({
-            **ach,
-            "unlocked": ach["id"] in unlocked
-        })
-    
-    return achievements
+async def get_achievements(request: Request, fields: Optional[str] = None, user_id: str = Depends(get_user_id)):
+    """Get all achievements with unlock status, optionally only `fields` of each"""
+    selected = parse_fields(fields, ACHIEVEMENT_ITEM_FIELDS)
+    # The catalog fields alone depend on nothing in the progress but its version
+    sources = ACHIEVEMENTS_FIELDS if selected is None or "unlocked" in selected else ("version",)
+    progress = await get_or_create_progress(user_id, sources)
+    route = "achievements" if selected is None else f"achievements?fields={','.join(selected)}"
+    return cached_json_response(request, user_id, route, progress, lambda p: build_achievements(p, selected))
 
 @api_router.get("/progress")
-async def get_progress():
+async def get_progress(user_id: str = Depends(get_user_id)):
     """Get raw user progress data"""
-    progress = await get_or_create_progress()
+    progress = await get_or_create_progress(user_id)
     return progress
 
 @api_router.post("/progress/reset")
-async def reset_progress():
+async def reset_progress(user_id: str = Depends(get_user_id)):
     """Reset all progress (for testing)"""
-    await db.user_progress.delete_many({})
-    new_progress = UserProgress()
-    doc = new_progress.model_dump()
-    await db.user_progress.insert_one(doc)
+    # Logged so that a replay does not resurrect the cleared progress
+    await store.reset(user_id, [StudyEvent(user_id=user_id, type="reset").model_dump(exclude_none=True)])
+    progress_reader.invalidate(user_id)
+    leaderboard.record(user_id, empty_progress_fields())
+    progress_broker.publish(user_id, *ProgressBroker.RESYNC)
     return {"message": "Progress reset successfully"}
 
-# Include the router in the main app
-app.include_router(api_router)
+@api_router.get("/admin/progress/export", dependencies=[Depends(require_admin)])
+async def export_progress():
+    """Stream every user's progress as NDJSON, for backups and migrations"""
+    return StreamingResponse(
+        export_progress_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="progress.ndjson"'}
+    )
+
+@api_router.post("/admin/progress/import", dependencies=[Depends(require_admin)])
+async def import_progress(request: Request):
+    """Upsert progress from an NDJSON upload, as produced by the export"""
+    return await import_progress_ndjson(request.stream())
+
+@api_router.get("/admin/jobs", dependencies=[Depends(require_admin)])
+async def get_jobs():
+    """Background job status, run counts and last run times"""
+    return {"enabled": SCHEDULER_ENABLED, "jobs": scheduler.status()}
+
+@api_router.get("/analytics/heatmap")
+async def get_activity_heatmap(
+    request: Request,
+    days: int = Query(365, ge=1, le=3660),
+    user_id: str = Depends(get_user_id)
+):
+    """Units completed and pomodoros per study day, for days with activity"""
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+    return await analytics_response(
+        request, user_id, f"heatmap?days={days}", lambda rows: [r for r in rows if r["day"] >= since]
+    )
+
+@api_router.get("/analytics/xp")
+async def get_xp_history(
+    request: Request,
+    days: Optional[int] = Query(None, ge=1, le=3660),
+    user_id: str = Depends(get_user_id)
+):
+    """XP at the end of each day since the first recorded event"""
+    return await analytics_response(
+        request, user_id, f"xp?days={days}", lambda rows: rows if days is None else rows[-days:]
+    )
+
+@api_router.get("/analytics/subjects")
+async def get_subject_velocity(request: Request, user_id: str = Depends(get_user_id)):
+    """Per-subject completion velocity and projected finish date"""
+    return await analytics_response(request, user_id, "subjects", lambda rows: rows)
+
+@api_router.get("/leaderboard", dependencies=[Depends(get_user_id)])
+async def get_leaderboard(
+    scope: str = OVERALL_SCOPE,
+    limit: int = Query(10, ge=1, le=LEADERBOARD_SIZE)
+):
+    """Top students by XP (overall or within one subject), ties broken by streak"""
+    scope = resolve_scope(scope)
+    return {"scope": scope, "entries": await leaderboard.top(scope, limit)}
+
+@api_router.get("/leaderboard/me")
+async def get_my_rank(scope: str = OVERALL_SCOPE, user_id: str = Depends(get_user_id)):
+    """The calling user's leaderboard rank"""
+    scope = resolve_scope(scope)
+    progress = await get_or_create_progress(user_id, ("xp", "completed_units", "streak_days"))
+    score = progress["xp"] if scope == OVERALL_SCOPE else curriculum.subject_xp(progress["completed_units"]).get(scope, 0)
+    return {
+        "scope": scope,
+        "user_id": user_id,
+        "rank": await leaderboard.rank(scope, user_id, score, progress["streak_days"]),
+        "xp": score,
+        "streak_days": progress["streak_days"]
+    }
+
+@api_router.get("/progress/stream")
+async def stream_progress(user_id: str = Depends(get_stream_user_id)):
+    """Server-sent events with compact deltas of the user's progress
+
+    Starts with a `sync` event holding the current state and repeats it
+    whenever the client must resync (after a reset, or when it fell
+    behind). Mutations then arrive as `units`, `stats` and `achievements`
+    events.
+    """
+    async def events():
+        queue = progress_broker.subscribe(user_id)
+        try:
+            event, data = ProgressBroker.RESYNC
+            while True:
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    if data is None:
+                        data = await sync_state(user_id)
+                    yield format_sse(event, data)
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    event, data = None, None
+        finally:
+            progress_broker.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request and database metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Include the router in the main app. Serverless runtimes may not send
+# lifespan events, so routes also make sure the store is set up (and then
+# that the curriculum is current).
+app.include_router(api_router, dependencies=[Depends(store_ready), Depends(curriculum_current)])
 
 app.add_middleware(
     CORSMiddleware,
@@ -485,8 +3240,89 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Added last so it wraps CORS and times every response, preflights included
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def setup_store():
+    # Cold starts defer setup to the first request instead
+    if not COLD_START_MODE:
+        await store.ensure_ready()
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
 @app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def shutdown_store():
+    await scheduler.stop()
+    await store.close()
+
+startup_report.mark("routes")
+if startup_report.import_seconds * 1000 > IMPORT_TIME_BUDGET_MS:
+    logger.warning("Start-up over the %.0fms import budget: %s",
+                   IMPORT_TIME_BUDGET_MS, startup_report.as_dict(IMPORT_TIME_BUDGET_MS))
+elif COLD_START_MODE:
+    logger.info("Start-up: %s", startup_report.as_dict(IMPORT_TIME_BUDGET_MS))
+
+async def run_command(args: argparse.Namespace) -> None:
+    if args.command == "curriculum":
+        document = parse_curriculum(Path(args.path).read_text(encoding="utf-8"), args.path)
+        checked = Curriculum(document)
+        logger.info("Curriculum version %s is valid: %d subjects, %d units, %d achievements",
+                    checked.version, len(checked.subjects), checked.total_units, len(checked.achievements))
+        if not args.publish:
+            return
+        if not isinstance(store, MongoProgressStore):
+            raise SystemExit("--publish needs STORAGE_BACKEND=mongo")
+    if isinstance(store, MongoProgressStore):
+        # Maintenance runs from a shell or deploy step, never a cold start
+        store.create_indexes = True
+    await store.ensure_ready()
+    if args.command == "setup":
+        # With the Mongo source, bring the newest published version in first
+        await curriculum_reloader.check()
+        await store.sync_curriculum(curriculum)
+        await recompute_achievements()
+    elif args.command == "curriculum":
+        # The unique version index rejects republishing a version
+        await store.db.curriculum.insert_one(document.model_dump())
+        await store.sync_curriculum(checked)
+        logger.info("Published curriculum version %s", checked.version)
+        # Installed here too, so achievements are recomputed against it
+        install_curriculum(checked)
+        await recompute_achievements()
+    elif args.command == "baseline":
+        logger.info("Seeded %d baseline events", await seed_baseline_events())
+    elif args.command == "replay":
+        logger.info("Rebuilt %d progress snapshots", await replay_snapshots(args.user, args.batch_size))
+    elif args.command == "job":
+        # For cold-start deployments, which run no scheduler: call from cron
+        job = scheduler.jobs[args.name]
+        await job.run()
+        logger.info("Job %s: %s", job.name, job.status())
+    await store.close()
+
+if __name__ == "__main__":
+    # Maintenance commands: python server.py {setup,startup,curriculum,baseline,replay,job} [--user ID]
+    parser = argparse.ArgumentParser(description="Study Tracker maintenance commands")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("setup", help="create indexes and migrate legacy documents (run at deploy time)")
+    subcommands.add_parser("startup", help="print the start-up time report; exit 1 when over the import budget")
+    curriculum_parser = subcommands.add_parser("curriculum", help="validate a curriculum file")
+    curriculum_parser.add_argument("path")
+    curriculum_parser.add_argument("--publish", action="store_true",
+                                   help="also publish it to the Mongo `curriculum` collection")
+    subcommands.add_parser("baseline", help="seed baseline events from existing snapshots")
+    replay_parser = subcommands.add_parser("replay", help="rebuild progress snapshots from study events")
+    replay_parser.add_argument("--user", help="only rebuild this user")
+    replay_parser.add_argument("--batch-size", type=int, default=500)
+    job_parser = subcommands.add_parser("job", help="run one background job now")
+    job_parser.add_argument("name", choices=sorted(scheduler.jobs))
+    args = parser.parse_args(sys.argv[1:])
+    if args.command == "startup":
+        report = startup_report.as_dict(IMPORT_TIME_BUDGET_MS)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["within_budget"] else 1)
+    asyncio.run(run_command(args))
@@ -28,6 +28,33 @@ export default function Dashboard() {
 
   useEffect(() => {
     fetchDashboard();
+
+    // Live updates from other tabs and devices. Stats and achievements are
+    // merged in place; unit changes and resyncs refetch, since the subject
+    // totals are derived from the completed units.
+    const stream = new EventSource(`${API}/progress/stream`);
+    let synced = false;
+    stream.addEventListener("sync", () => {
+      // The first sync repeats the state just fetched
+      if (synced) fetchDashboard();
+      synced = true;
+    });
+    stream.addEventListener("units", () => fetchDashboard());
+    stream.addEventListener("stats", (event) => {
+      const stats = JSON.parse(event.data);
+      setDashboard((current) => current && { ...current, ...stats });
+    });
+    stream.addEventListener("achievements", (event) => {
+      const { unlocked } = JSON.parse(event.data);
+      setDashboard((current) => current && {
+        ...current,
+        unlocked_achievements: [
+          ...current.unlocked_achievements,
+          ...unlocked.filter((id) => !current.unlocked_achievements.includes(id)),
+        ],
+      });
+    });
+    return () => stream.close();
   }, []);
 
   if (loading) {
@@ -23,22 +23,17 @@ export default function SubjectPage() {
 
   const fetchSubject = async () => {
     try {
-      const [subjectsRes, progressRes] = await Promise.all([
-        axios.get(`${API}/subjects`),
-        axios.get(`${API}/progress`),
-      ]);
-
       const decodedName = decodeURIComponent(subjectName);
-      const found = subjectsRes.data.find(
-        (s) => s.name.toLowerCase() === decodedName.toLowerCase()
+      const response = await axios.get(
+        `${API}/subjects/${encodeURIComponent(decodedName)}`
       );
 
-      if (found) {
-        setSubject(found);
-        setCompletedUnits(progressRes.data.completed_units || []);
-      }
+      setSubject(response.data);
+      setCompletedUnits(response.data.completed_unit_ids || []);
     } catch (error) {
-      console.error("Error fetching subject:", error);
+      if (error.response?.status !== 404) {
+        console.error("Error fetching subject:", error);
+      }
     } finally {
       setLoading(false);
     }
@@ -0,0 +1,191 @@
+"""Load test and latency benchmark for the Study Tracker API.
+
+Drives the FastAPI app in-process through an ASGI transport against the
+in-memory storage engine, so results measure the API logic itself rather
+than network or database latency. Latencies are measured closed-loop,
+so under concurrency they include time spent queued on the event loop
+behind other in-flight requests.
+
+    python -m tests.benchmark --requests 5000 --concurrency 32
+    python -m tests.benchmark --output bench.json
+    python -m tests.benchmark --baseline bench.json --max-regression 0.25
+
+The report is printed (and optionally written) as JSON. With --baseline,
+the run exits non-zero when a route's p95 latency or the overall
+throughput regresses by more than --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / "frontend" / "api"
+
+DEFAULT_MIX = "dashboard=70,toggle=20,pomodoro=10"
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("dashboard", "toggle", "pomodoro"):
+            raise argparse.ArgumentTypeError(f"Unknown operation in mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list, errors: int, duration: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / duration, 1) if duration else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+def plan_requests(args, unit_ids: list) -> list:
+    """Pre-generate the request sequence so runs with a seed are reproducible"""
+    rng = random.Random(args.seed)
+    names = list(args.mix)
+    weights = [args.mix[n] for n in names]
+    plan = []
+    for _ in range(args.requests):
+        op = rng.choices(names, weights)[0]
+        user = f"bench-{rng.randrange(args.users)}"
+        plan.append((op, user, rng.choice(unit_ids)))
+    return plan
+
+
+async def run(args) -> dict:
+    os.environ["STORAGE_BACKEND"] = "memory"
+    sys.path.insert(0, str(API_DIR))
+    import httpx
+    import server
+
+    await server.store.setup()
+    plan = plan_requests(args, list(server.curriculum.unit_index))
+    etags = {}
+    latencies = {name: [] for name in args.mix}
+    errors = {name: 0 for name in args.mix}
+
+    async def send(client, op, user, unit_id):
+        headers = {"X-User-Id": user}
+        if op == "dashboard":
+            if args.conditional and user in etags:
+                headers["If-None-Match"] = etags[user]
+            response = await client.get("/api/dashboard", headers=headers)
+            if response.status_code == 200:
+                etags[user] = response.headers.get("etag")
+            return response.status_code in (200, 304)
+        if op == "toggle":
+            response = await client.post("/api/units/toggle", json={"unit_id": unit_id}, headers=headers)
+        else:
+            response = await client.post(
+                "/api/pomodoro/complete", json={"duration_minutes": 25, "completed": True}, headers=headers
+            )
+        return response.status_code == 200
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for op, user, unit_id in plan[:args.warmup]:
+            await send(client, op, user, unit_id)
+
+        queue = iter(plan)
+
+        async def worker():
+            for op, user, unit_id in queue:
+                start = time.perf_counter()
+                ok = await send(client, op, user, unit_id)
+                latencies[op].append(time.perf_counter() - start)
+                if not ok:
+                    errors[op] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+
+    await server.store.close()
+    all_latencies = [l for values in latencies.values() for l in values]
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "mix": args.mix,
+            "conditional": args.conditional,
+            "seed": args.seed,
+        },
+        "duration_s": round(duration, 3),
+        "total": summarize(all_latencies, sum(errors.values()), duration),
+        "routes": {
+            name: summarize(latencies[name], errors[name], duration) for name in args.mix if latencies[name]
+        },
+    }
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, stats in report["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if before and before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {stats['p95_ms']}ms vs baseline {before['p95_ms']}ms")
+    before_rps = baseline.get("total", {}).get("throughput_rps")
+    if before_rps and report["total"]["throughput_rps"] < before_rps * (1 - tolerance):
+        regressions.append(
+            f"throughput {report['total']['throughput_rps']} rps vs baseline {before_rps} rps"
+        )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Study Tracker API benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted operation mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--conditional", action="store_true",
+                        help="revalidate dashboard reads with If-None-Match like a browser")
+    parser.add_argument("--output", help="also write the JSON report to this path")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative slowdown versus the baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = find_regressions(report, baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
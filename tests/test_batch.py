@@ -0,0 +1,81 @@
+"""Idempotency of /api/batch against the in-memory storage engine.
+
+    python -m pytest tests/test_batch.py
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+API_DIR = Path(__file__).resolve().parent.parent / "frontend" / "api"
+
+os.environ["STORAGE_BACKEND"] = "memory"
+sys.path.insert(0, str(API_DIR))
+
+import httpx  # noqa: E402
+import server  # noqa: E402
+
+
+def post_batches(user_id: str, *batches: dict) -> list:
+    """POST each batch in turn as `user_id`, returning the JSON responses"""
+    async def run():
+        await server.store.ensure_ready()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = []
+            for batch in batches:
+                response = await client.post("/api/batch", json=batch, headers={"X-User-Id": user_id})
+                assert response.status_code == 200, response.text
+                responses.append(response.json())
+            return responses
+    return asyncio.run(run())
+
+
+def statuses(response: dict) -> list:
+    return [result["status"] for result in response["results"]]
+
+
+@pytest.fixture
+def user_id(request) -> str:
+    return f"batch-{request.node.name}"
+
+
+def test_resent_batch_is_reported_as_duplicate(user_id):
+    batch = {"operations": [{"op": "pomodoro", "idempotency_key": "p1"}]}
+    first, resent = post_batches(user_id, batch, batch)
+    assert statuses(first) == ["applied"]
+    assert statuses(resent) == ["duplicate"]
+    assert resent["pomodoro_sessions"] == first["pomodoro_sessions"] == 1
+
+
+def test_resent_toggle_does_not_flip_the_unit_back(user_id):
+    batch = {"operations": [{"op": "toggle", "idempotency_key": "t1", "unit_id": "maths-1"}]}
+    first, resent = post_batches(user_id, batch, batch)
+    assert statuses(resent) == ["duplicate"]
+    assert resent["completed_units"] == first["completed_units"] == ["maths-1"]
+    assert resent["xp"] == first["xp"]
+
+
+def test_partially_resent_batch_applies_only_new_keys(user_id):
+    first = {"operations": [{"op": "pomodoro", "idempotency_key": "p1"}]}
+    retry = {"operations": [
+        {"op": "pomodoro", "idempotency_key": "p1"},
+        {"op": "pomodoro", "idempotency_key": "p2"},
+        {"op": "pomodoro", "idempotency_key": "p2"},
+    ]}
+    _, response = post_batches(user_id, first, retry)
+    assert statuses(response) == ["duplicate", "applied", "duplicate"]
+    assert response["pomodoro_sessions"] == 2
+
+
+def test_toggle_without_unit_id_is_rejected(user_id):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/batch", json={"operations": [{"op": "toggle", "idempotency_key": "t1"}]},
+                headers={"X-User-Id": user_id}
+            )
+    assert asyncio.run(run()).status_code == 422
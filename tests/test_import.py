@@ -0,0 +1,64 @@
+"""NDJSON progress import: line splitting and document validation.
+
+    python -m pytest tests/test_import.py
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+API_DIR = Path(__file__).resolve().parent.parent / "frontend" / "api"
+
+os.environ["STORAGE_BACKEND"] = "memory"
+sys.path.insert(0, str(API_DIR))
+
+import server  # noqa: E402
+
+
+def lines(*chunks: bytes) -> list:
+    """ndjson_lines over `chunks` as they would arrive from a request body"""
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [item async for item in server.ndjson_lines(body())]
+    return asyncio.run(run())
+
+
+def test_lines_split_across_chunks_are_joined():
+    assert lines(b'{"a"', b': 1}\n{"b": 2}\n{"c"', b": 3}\n") == [
+        (1, b'{"a": 1}'), (2, b'{"b": 2}'), (3, b'{"c": 3}')
+    ]
+
+
+def test_blank_lines_are_skipped_but_counted():
+    assert lines(b"one\n\n  \nfour\n") == [(1, b"one"), (4, b"four")]
+
+
+def test_final_line_without_newline_is_yielded():
+    assert lines(b"one\ntw", b"o") == [(1, b"one"), (2, b"two")]
+
+
+def test_over_long_lines_are_reported_and_skipped(monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_MAX_LINE_BYTES", 8)
+    # Over-long within one chunk, then one only found over the limit while
+    # buffering and skipped across the following chunks
+    assert lines(b"ok\n0123456789\nfine\n0123", b"456789", b"abc", b"def\nlast\n") == [
+        (1, b"ok"), (2, None), (3, b"fine"), (4, None), (5, b"last")
+    ]
+
+
+def test_import_rejects_unknown_unit_ids():
+    with pytest.raises(ValueError, match="Unknown unit ids: no-such-unit"):
+        server.import_snapshot({"user_id": "importer", "completed_units": ["no-such-unit"]})
+
+
+def test_import_recomputes_xp_from_completed_units():
+    unit_id = sorted(server.curriculum.unit_index)[0]
+    snapshot = server.import_snapshot({"user_id": "importer", "completed_units": [unit_id, unit_id], "xp": 12345})
+    assert snapshot["completed_units"] == [unit_id]
+    assert snapshot["xp"] == server.curriculum.unit_xp[unit_id]
+    assert snapshot["level"] == server.calculate_level(snapshot["xp"])
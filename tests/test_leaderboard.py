@@ -0,0 +1,67 @@
+"""Cached leaderboard ranks against the in-memory storage engine.
+
+    python -m pytest tests/test_leaderboard.py
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+API_DIR = Path(__file__).resolve().parent.parent / "frontend" / "api"
+
+os.environ["STORAGE_BACKEND"] = "memory"
+sys.path.insert(0, str(API_DIR))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def store(monkeypatch) -> server.MemoryProgressStore:
+    store = server.MemoryProgressStore()
+    monkeypatch.setattr(server, "store", store)
+    return store
+
+
+def write(store: server.MemoryProgressStore, leaderboard: server.Leaderboard, user_id: str, xp: int) -> None:
+    """Store `user_id` with `xp` and record the write on the cached board"""
+    doc = store._doc(user_id)
+    doc["xp"] = xp
+    leaderboard.record(user_id, doc)
+
+
+def ranks(leaderboard: server.Leaderboard, *user_ids: str) -> list:
+    async def run():
+        return [
+            await leaderboard.rank(server.OVERALL_SCOPE, user_id, server.store.progress[user_id]["xp"], 0)
+            for user_id in user_ids
+        ]
+    return asyncio.run(run())
+
+
+def test_scope_loaded_short_of_k_ranks_users_past_the_cut_off(store):
+    leaderboard = server.Leaderboard(size=2, ttl=60)
+    write(store, leaderboard, "a", 40)
+    assert ranks(leaderboard, "a") == [1]
+    for user_id, xp in (("b", 30), ("c", 20), ("d", 10)):
+        write(store, leaderboard, user_id, xp)
+    assert ranks(leaderboard, "a", "b", "c", "d") == [1, 2, 3, 4]
+
+
+def test_user_moving_into_the_top_k_pushes_the_last_one_out(store):
+    leaderboard = server.Leaderboard(size=2, ttl=60)
+    for user_id, xp in (("a", 30), ("b", 20), ("c", 10)):
+        write(store, leaderboard, user_id, xp)
+    assert ranks(leaderboard, "a", "b", "c") == [1, 2, 3]
+    write(store, leaderboard, "c", 50)
+    assert ranks(leaderboard, "c", "a", "b") == [1, 2, 3]
+
+
+def test_user_dropping_out_of_the_top_k_reloads_the_scope(store):
+    leaderboard = server.Leaderboard(size=2, ttl=60)
+    for user_id, xp in (("a", 30), ("b", 20), ("c", 10)):
+        write(store, leaderboard, user_id, xp)
+    assert ranks(leaderboard, "a") == [1]
+    write(store, leaderboard, "a", 0)
+    assert ranks(leaderboard, "b", "c", "a") == [1, 2, 3]
@@ -0,0 +1,77 @@
+"""The in-memory and SQLite storage engines agree on the same writes.
+
+    python -m pytest tests/test_stores.py
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / "frontend" / "api"
+
+os.environ["STORAGE_BACKEND"] = "memory"
+sys.path.insert(0, str(API_DIR))
+
+import server  # noqa: E402
+from server import Mutation  # noqa: E402
+
+# Written each run, so they differ between engines by design
+VOLATILE = {"id", "created_at", "updated_at"}
+
+
+def writes() -> list:
+    units = sorted(server.curriculum.unit_index)
+    return [
+        ("alice", [Mutation("toggle", units[0]), Mutation("toggle", units[1])], "w1"),
+        ("alice", [Mutation("pomodoro", duration_minutes=25, key="p1")], "w2"),
+        # Resent with a new write id: the key makes it a no-op
+        ("alice", [Mutation("pomodoro", duration_minutes=25, key="p1")], "w3"),
+        ("alice", [Mutation("toggle", units[0], key="t1")], "w4"),
+        ("bob", [Mutation("toggle", units[-1]), Mutation("pomodoro")], "w5"),
+        ("bob", [], None),
+    ]
+
+
+async def run_writes(store: server.ProgressStore) -> dict:
+    await store.ensure_ready()
+    try:
+        for user_id, mutations, write_id in writes():
+            await store.apply_mutations(
+                user_id, mutations, write_id=write_id, events=server.mutation_events(user_id, mutations)
+            )
+        await store.unlock_achievements("alice", ["first_unit"])
+        await store.reset("bob", [server.StudyEvent(user_id="bob", type="reset", ts="t").model_dump(exclude_none=True)])
+        progress = {}
+        for user_id in ("alice", "bob"):
+            doc = await store.get_or_create(user_id)
+            progress[user_id] = {k: v for k, v in doc.items() if k not in VOLATILE}
+        events = [{k: v for k, v in e.items() if k != "ts"} async for e in store.iter_events()]
+        return {"progress": progress, "events": events}
+    finally:
+        await store.close()
+
+
+def test_memory_and_sqlite_engines_agree(tmp_path):
+    memory = asyncio.run(run_writes(server.MemoryProgressStore()))
+    sqlite = asyncio.run(run_writes(server.SqliteProgressStore(str(tmp_path / "progress.db"))))
+    assert sqlite == memory
+    assert memory["progress"]["alice"]["pomodoro_sessions"] == 1
+
+
+def test_sqlite_snapshot_failures_are_reported_per_row(tmp_path):
+    async def run():
+        store = server.SqliteProgressStore(str(tmp_path / "progress.db"))
+        await store.ensure_ready()
+        try:
+            errors = await store.write_snapshots([
+                {"user_id": "alice", "xp": 100},
+                {"user_id": "bob", "xp": object()},
+                {"user_id": "carol", "xp": 300},
+            ])
+            xp = [(await store.get_or_create(u))["xp"] for u in ("alice", "bob", "carol")]
+            return errors, xp
+        finally:
+            await store.close()
+    errors, xp = asyncio.run(run())
+    assert list(errors) == [1]
+    assert xp == [100, 0, 300]